@@ -0,0 +1,261 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from event_log import song_event
+from library_index import LibraryIndex
+from match_cache import MatchCache
+from music_services.music_service import MusicService, Playlist, Song
+from playlist_transfer import ChunkedWriter
+from song_matcher import SongMatcher
+
+T = TypeVar("T")
+
+# Sentinel marking the end of a pipeline stage's output
+DONE = object()
+
+
+class AsyncMusicService:
+    """
+    Async adapter for a MusicService. Calls to the blocking client run in an
+    executor, so they never block the event loop.
+    """
+
+    def __init__(self, service: MusicService, executor: Optional[Executor] = None):
+        self.service = service
+        self.executor = executor
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def __iterate(self, items: Iterable[T]) -> AsyncIterator[T]:
+        # Iterating may fetch the next page from the service, so every step
+        # runs in the executor too
+        iterator = await self.run(iter, items)
+        while True:
+            item = await self.run(next, iterator, DONE)
+            if item is DONE:
+                return
+            yield item
+
+    async def get_user_id(self) -> str:
+        return await self.run(self.service.get_user_id)
+
+    async def create_playlist(self, name: str, description: str = "") -> str:
+        return await self.run(self.service.create_playlist, name, description)
+
+    async def add_song_to_playlist(self, playlist_id: str, song_id: str) -> None:
+        await self.run(self.service.add_song_to_playlist, playlist_id, song_id)
+
+    async def add_songs_to_playlist(
+        self, playlist_id: str, song_ids: List[str]
+    ) -> None:
+        await self.run(self.service.add_songs_to_playlist, playlist_id, song_ids)
+
+    async def get_all_playlists(self) -> List[Playlist]:
+        return await self.run(self.service.get_all_playlists)
+
+    async def get_playlist_songs(self, playlist_id: str) -> Optional[List[Song]]:
+        return await self.run(self.service.get_playlist_songs, playlist_id)
+
+    async def iter_playlist_songs(self, playlist_id: str) -> AsyncIterator[Song]:
+        songs = await self.run(self.service.iter_playlist_songs, playlist_id)
+        if songs is None:
+            raise ValueError(f"Could not retrieve songs from playlist {playlist_id}")
+
+        async for song in self.__iterate(songs):
+            yield song
+
+    async def get_liked_songs(self) -> List[Song]:
+        return await self.run(self.service.get_liked_songs)
+
+    async def iter_liked_songs(self) -> AsyncIterator[Song]:
+        songs = await self.run(self.service.iter_liked_songs)
+        async for song in self.__iterate(songs):
+            yield song
+
+    async def add_song_to_liked_songs(self, song_id: str) -> None:
+        await self.run(self.service.add_song_to_liked_songs, song_id)
+
+    async def add_songs_to_liked_songs(self, song_ids: List[str]) -> None:
+        await self.run(self.service.add_songs_to_liked_songs, song_ids)
+
+    async def search_song(self, query: str, artist: str) -> Optional[Song]:
+        return await self.run(self.service.search_song, query, artist)
+
+
+class AsyncPlaylistTransferer:
+    """
+    Asyncio counterpart of PlaylistTransferer, for embedding transfers in an
+    event loop. Fetching, searching and writing run as pipelined stages
+    connected by bounded queues, with up to `workers` searches in flight.
+
+    The service clients are blocking, so searches run on the executor's
+    threads; the event loop only coordinates them.
+    """
+
+    def __init__(
+        self,
+        origin: MusicService,
+        destination: MusicService,
+        logger: Optional[logging.Logger] = None,
+        dry_run: bool = False,
+        workers: int = 8,
+        cache: Optional[MatchCache] = None,
+        executor: Optional[Executor] = None,
+        index: Optional[LibraryIndex] = None,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.logger = logger or AsyncPlaylistTransferer.__get_null_logger()
+        self.dry_run = dry_run
+        self.workers = workers
+        self.matcher = SongMatcher(destination, self.logger, cache, index=index)
+
+        # Searches, origin fetches and writes share the executor
+        self.__owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers + 2)
+        self.origin = AsyncMusicService(origin, self.executor)
+        self.destination = AsyncMusicService(destination, self.executor)
+
+    @staticmethod
+    def __get_null_logger() -> logging.Logger:
+        logger = logging.getLogger(__name__)
+        logger.addHandler(logging.NullHandler())
+        return logger
+
+    def close(self) -> None:
+        if self.__owns_executor:
+            self.executor.shutdown()
+
+    async def __aenter__(self) -> "AsyncPlaylistTransferer":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def __transfer_songs(
+        self, context: str, songs: AsyncIterator[Song], writer: ChunkedWriter
+    ) -> List[Song]:
+        window = self.workers * 2
+        to_search: asyncio.Queue = asyncio.Queue(maxsize=window)
+        to_write: asyncio.Queue = asyncio.Queue(maxsize=window)
+        # Bounds the songs between the fetch and write stages, including the
+        # ones buffered by the writer while it waits for an earlier song
+        in_flight = asyncio.Semaphore(window)
+
+        async def fetch() -> None:
+            index = 0
+            async for song in songs:
+                await in_flight.acquire()
+                await to_search.put((index, song))
+                index += 1
+            for _ in range(self.workers):
+                await to_search.put(DONE)
+
+        async def search() -> None:
+            while True:
+                item = await to_search.get()
+                if item is DONE:
+                    return
+                index, song = item
+                match = await self.destination.run(self.matcher.match, song, context)
+                await to_write.put((index, song, match))
+
+        async def search_all() -> None:
+            await asyncio.gather(*[search() for _ in range(self.workers)])
+            await to_write.put(DONE)
+
+        async def write() -> List[Song]:
+            not_match = []
+            # Searches finish out of order, so results wait here until every
+            # song before them has been handled
+            pending: Dict[int, Tuple[Song, Optional[Song]]] = {}
+            next_index = 0
+
+            while True:
+                item = await to_write.get()
+                if item is DONE:
+                    break
+                index, song, match = item
+                pending[index] = (song, match)
+
+                while next_index in pending:
+                    song, match = pending.pop(next_index)
+                    if match:
+                        self.logger.info(
+                            '%s: found match: "%s"',
+                            context,
+                            match.name,
+                            extra=song_event("song_match", context, song, match),
+                        )
+                        await self.destination.run(writer.add, match.id, song)
+                    else:
+                        self.logger.warning(
+                            '%s: No match for "%s"',
+                            context,
+                            song.name,
+                            extra=song_event("song_not_found", context, song),
+                        )
+                        not_match.append(song)
+                    next_index += 1
+                    in_flight.release()
+
+            await self.destination.run(writer.flush)
+            return not_match + writer.failed_songs
+
+        tasks = [
+            asyncio.ensure_future(fetch()),
+            asyncio.ensure_future(search_all()),
+            asyncio.ensure_future(write()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return tasks[-1].result()
+
+    async def transfer_playlist(self, playlist: Playlist) -> List[Song]:
+        to_playlist = (
+            "DRY-RUN"
+            if self.dry_run
+            else await self.destination.create_playlist(
+                playlist.name, playlist.description
+            )
+        )
+
+        self.logger.debug(f'Created playlist "{playlist.name}" with ID {to_playlist}')
+
+        writer = ChunkedWriter.for_playlist(
+            self.destination.service, to_playlist, self.logger, self.dry_run
+        )
+        return await self.__transfer_songs(
+            f"Playlist {to_playlist}",
+            self.origin.iter_playlist_songs(playlist.id),
+            writer,
+        )
+
+    async def transfer_liked_songs(self) -> List[Song]:
+        writer = ChunkedWriter.for_liked_songs(
+            self.destination.service, self.logger, self.dry_run
+        )
+        return await self.__transfer_songs(
+            "Liked songs", self.origin.iter_liked_songs(), writer
+        )
@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fake_services import FakeMusicService, FaultProfile, SyntheticLibrary
+from music_services.music_service import Song
+from music_services.rate_limiter import RateLimiter
+from playlist_transfer import PlaylistTransferer
+from transfer_scheduler import TransferScheduler
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def timed(
+    match: Callable[[Song, str], Optional[Song]], latencies: List[float]
+) -> Callable[[Song, str], Optional[Song]]:
+    def wrapper(song: Song, context: str) -> Optional[Song]:
+        start = time.perf_counter()
+        try:
+            return match(song, context)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Transfers a synthetic library between two fake services and measures the
+    transfer.
+
+    Args:
+        args (argparse.Namespace): The parsed command-line arguments.
+
+    Returns:
+        Dict[str, Any]: The measurements of the run.
+    """
+    library = SyntheticLibrary.generate(
+        args.songs,
+        playlists=args.playlists,
+        duplicate_rate=args.duplicate_rate,
+        miss_rate=args.miss_rate,
+        isrc_rate=args.isrc_rate,
+        seed=args.seed,
+    )
+    origin = FakeMusicService.named("fake-origin")(
+        library, FaultProfile(latency=args.origin_latency), seed=args.seed
+    )
+    destination = FakeMusicService.named("fake-destination", args.rate_limit)(
+        library,
+        FaultProfile(
+            latency=args.latency, error_rate=args.error_rate, quota=args.quota
+        ),
+        seed=args.seed,
+    )
+
+    logger = logging.getLogger("benchmark")
+    # The rate limiters log throttling under the music_services package
+    handler = logging.StreamHandler()
+    for name in ["benchmark", "music_services"]:
+        logging.getLogger(name).addHandler(handler)
+        logging.getLogger(name).setLevel(
+            logging.INFO if args.verbose else logging.ERROR
+        )
+
+    latencies: List[float] = []
+    not_found = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    with PlaylistTransferer(
+        origin, destination, logger, workers=args.workers
+    ) as transferer:
+        transferer.matcher.match = timed(transferer.matcher.match, latencies)
+        scheduler = TransferScheduler(
+            transferer, args.parallel_playlists, prefetch=args.prefetch
+        )
+        for result in scheduler.run(origin.get_all_playlists()):
+            if result.error:
+                raise result.error
+            not_found += len(result.not_match)
+
+    elapsed = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    limiter = RateLimiter.all()[destination.arg_name()]
+    destination_calls = sum(destination.calls.values())
+    return {
+        "songs": library.size,
+        "seconds": elapsed,
+        "songs_per_second": library.size / elapsed,
+        "p50_latency_ms": percentile(latencies, 0.5) * 1000,
+        "p99_latency_ms": percentile(latencies, 0.99) * 1000,
+        "api_calls_per_song": destination_calls / library.size,
+        "api_calls": dict(destination.calls),
+        "retries": limiter.retries,
+        "throttles": limiter.throttles,
+        "not_found": not_found,
+        "peak_memory_mb": peak_memory / 2**20,
+    }
+
+
+def check_regression(
+    report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> bool:
+    slowest = baseline["songs_per_second"] * (1 - tolerance)
+    if report["songs_per_second"] < slowest:
+        print(
+            f"REGRESSION: {report['songs_per_second']:.1f} songs/s,"
+            + f" baseline is {baseline['songs_per_second']:.1f} songs/s"
+        )
+        return False
+    return True
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Songs:              {report['songs']}")
+    print(f"Time:               {report['seconds']:.2f}s")
+    print(f"Throughput:         {report['songs_per_second']:.1f} songs/s")
+    print(
+        f"Per-song latency:   p50 {report['p50_latency_ms']:.1f}ms,"
+        + f" p99 {report['p99_latency_ms']:.1f}ms"
+    )
+    print(f"API calls per song: {report['api_calls_per_song']:.3f}")
+    for method, calls in sorted(report["api_calls"].items()):
+        print(f"  {method}: {calls}")
+    print(f"Retries:            {report['retries']} ({report['throttles']} throttled)")
+    print(f"Not found:          {report['not_found']}")
+    print(f"Peak memory:        {report['peak_memory_mb']:.1f} MB")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure transfer throughput against in-memory fake services."
+    )
+    parser.add_argument(
+        "--songs",
+        type=int,
+        default=1000,
+        help="songs across all playlists (default: 1000)",
+    )
+    parser.add_argument(
+        "--playlists", type=int, default=10, help="number of playlists (default: 10)"
+    )
+    parser.add_argument(
+        "--duplicate-rate",
+        type=float,
+        default=0.4,
+        help="fraction of songs repeated across playlists (default: 0.4)",
+    )
+    parser.add_argument(
+        "--miss-rate",
+        type=float,
+        default=0.1,
+        help="fraction of songs missing from the destination (default: 0.1)",
+    )
+    parser.add_argument(
+        "--isrc-rate",
+        type=float,
+        default=0.0,
+        help="fraction of origin songs with an ISRC (default: 0)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="mean latency of destination calls, in seconds (default: 0.01)",
+    )
+    parser.add_argument(
+        "--origin-latency",
+        type=float,
+        default=0.0,
+        help="mean latency of origin calls, in seconds (default: 0)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of destination calls failing transiently (default: 0)",
+    )
+    parser.add_argument(
+        "--quota",
+        type=float,
+        help="destination calls per second accepted before answering 429",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        help="requests per second the destination's rate limiter starts at",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="search workers (default: 8)"
+    )
+    parser.add_argument(
+        "--parallel-playlists",
+        type=int,
+        default=4,
+        help="playlists transferred at the same time (default: 4)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="playlists fetched from the origin in advance (default: 2)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the synthetic library"
+    )
+    parser.add_argument("--output", help="file where the report is written as JSON")
+    parser.add_argument(
+        "--baseline",
+        help="JSON report of a previous run; fails if throughput regressed",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="throughput drop allowed against the baseline (default: 0.1)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="show transfer logs"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if not check_regression(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
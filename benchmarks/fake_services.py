@@ -0,0 +1,340 @@
+import random
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field, replace
+from typing import Deque, Dict, List, Optional, Type
+
+import requests
+
+from music_services.music_service import (
+    MusicService,
+    Playlist,
+    ServiceCapabilities,
+    Song,
+)
+from music_services.normalization import normalize_text
+
+WORDS = [
+    "love",
+    "night",
+    "heart",
+    "fire",
+    "dream",
+    "summer",
+    "blue",
+    "light",
+    "road",
+    "rain",
+    "gold",
+    "wild",
+    "home",
+    "river",
+    "dance",
+    "stars",
+]
+
+
+@dataclass
+class FaultProfile:
+    # Mean duration of every call, in seconds. Each call takes between half
+    # and one and a half times as long.
+    latency: float = 0.0
+    # Fraction of calls failing to connect
+    error_rate: float = 0.0
+    # Calls accepted per second before answering 429, or None for no quota
+    quota: Optional[float] = None
+    # Retry-After sent with 429 answers, in seconds
+    retry_after: float = 1.0
+
+
+@dataclass
+class SyntheticLibrary:
+    # Songs available in the destination
+    catalog: List[Song] = field(default_factory=list)
+    # Origin playlists, by ID
+    playlists: Dict[str, List[Song]] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return sum(len(songs) for songs in self.playlists.values())
+
+    @classmethod
+    def generate(
+        cls,
+        songs: int,
+        playlists: int = 10,
+        duplicate_rate: float = 0.4,
+        miss_rate: float = 0.1,
+        decoy_rate: float = 0.3,
+        isrc_rate: float = 0.0,
+        seed: int = 0,
+    ) -> "SyntheticLibrary":
+        """
+        Generates an origin library and the destination catalog to match it
+        against.
+
+        Args:
+            songs (int): The number of songs across all origin playlists.
+            playlists (int): The number of origin playlists.
+            duplicate_rate (float): Fraction of songs that repeat a song
+                already in some playlist.
+            miss_rate (float): Fraction of distinct songs missing from the
+                destination.
+            decoy_rate (float): Fraction of distinct songs that also have a
+                same-titled song by another artist in the destination.
+            isrc_rate (float): Fraction of origin songs that carry an ISRC.
+            seed (int): Seed of the random generator.
+
+        Returns:
+            SyntheticLibrary: The generated library.
+        """
+        rng = random.Random(seed)
+        library = cls()
+
+        distinct = []
+        for i in range(max(1, round(songs * (1 - duplicate_rate)))):
+            title = " ".join(rng.sample(WORDS, rng.randint(1, 3))).title()
+            artist = f"Artist {rng.randrange(max(1, songs // 20))}"
+            isrc = f"QZ{i:010d}"
+            duration = rng.randint(90, 420)
+            distinct.append(
+                Song(
+                    id=f"origin:{i}",
+                    name=f"{title} {i}",
+                    artist=artist,
+                    isrc=isrc if rng.random() < isrc_rate else None,
+                    duration=duration,
+                )
+            )
+
+            if rng.random() >= miss_rate:
+                library.catalog.append(
+                    Song(
+                        id=f"destination:{i}",
+                        name=f"{title} {i}",
+                        artist=artist,
+                        isrc=isrc,
+                        duration=duration + rng.randint(-1, 1),
+                    )
+                )
+            if rng.random() < decoy_rate:
+                library.catalog.append(
+                    Song(
+                        id=f"destination:{i}:decoy",
+                        name=f"{title} {i}",
+                        artist=f"{artist} Tribute Band",
+                        duration=duration + rng.randint(20, 60),
+                    )
+                )
+
+        entries = distinct + [
+            rng.choice(distinct) for _ in range(songs - len(distinct))
+        ]
+        rng.shuffle(entries)
+        for i in range(playlists):
+            library.playlists[f"playlist:{i}"] = entries[i::playlists]
+        return library
+
+
+class FakeMusicService(MusicService):
+    """
+    In-memory MusicService for benchmarks. It serves an origin library and a
+    destination catalog, records written songs, and simulates latency,
+    transient errors and a request quota. Every call goes through the shared
+    rate limiter like the real services do.
+
+    Use named() to get a subclass with its own name, since rate limiters are
+    shared by every service with the same arg_name().
+    """
+
+    NAME = "fake"
+    CAPABILITIES = ServiceCapabilities(
+        supports_bulk_add=True,
+        max_batch_size=100,
+        supports_bulk_like=True,
+        max_like_batch_size=50,
+        supports_isrc_search=True,
+        requests_per_second=1000.0,
+    )
+
+    def __init__(
+        self,
+        library: Optional[SyntheticLibrary] = None,
+        faults: Optional[FaultProfile] = None,
+        seed: int = 0,
+    ) -> None:
+        self.library = library or SyntheticLibrary()
+        self.faults = faults or FaultProfile()
+        self.calls: Counter = Counter()
+        self.written: Dict[str, List[str]] = defaultdict(list)
+        self.liked: List[str] = []
+
+        self.__lock = threading.Lock()
+        self.__rng = random.Random(seed)
+        self.__window: Deque[float] = deque()
+        self.__by_title: Dict[str, List[Song]] = defaultdict(list)
+        self.__by_isrc: Dict[str, Song] = {}
+        for song in self.library.catalog:
+            self.__by_title[normalize_text(song.name)].append(song)
+            if song.isrc:
+                self.__by_isrc[song.isrc] = song
+
+    @classmethod
+    def named(
+        cls, name: str, requests_per_second: Optional[float] = None
+    ) -> Type["FakeMusicService"]:
+        capabilities = cls.CAPABILITIES
+        if requests_per_second is not None:
+            capabilities = replace(
+                capabilities, requests_per_second=requests_per_second
+            )
+        return type(
+            f"{cls.__name__}[{name}]",
+            (cls,),
+            {"NAME": name, "CAPABILITIES": capabilities},
+        )
+
+    @classmethod
+    def has_auth(cls):
+        return True
+
+    @classmethod
+    def pretty_name(cls):
+        return cls.NAME.title()
+
+    @classmethod
+    def arg_name(cls):
+        return cls.NAME
+
+    @classmethod
+    def capabilities(cls):
+        return cls.CAPABILITIES
+
+    @staticmethod
+    def __throttled(retry_after: float) -> requests.HTTPError:
+        response = requests.Response()
+        response.status_code = 429
+        response.headers["Retry-After"] = str(retry_after)
+        return requests.HTTPError("429 Too Many Requests", response=response)
+
+    def __request(self, method: str) -> None:
+        with self.__lock:
+            self.calls[method] += 1
+            now = time.monotonic()
+            if self.faults.quota is not None:
+                while self.__window and now - self.__window[0] > 1:
+                    self.__window.popleft()
+                if len(self.__window) >= self.faults.quota:
+                    raise FakeMusicService.__throttled(self.faults.retry_after)
+                self.__window.append(now)
+
+            failed = self.__rng.random() < self.faults.error_rate
+            delay = self.faults.latency * self.__rng.uniform(0.5, 1.5)
+
+        if delay:
+            time.sleep(delay)
+        if failed:
+            # Connecting fails before the request is sent, so even writes that
+            # are not idempotent can be retried
+            raise requests.ConnectTimeout(f"{self.NAME}: simulated failure")
+
+    def __get_user_id(self):
+        self.__request("get_user_id")
+        return "benchmark"
+
+    def __create_playlist(self, name):
+        self.__request("create_playlist")
+        with self.__lock:
+            playlist_id = f"{self.NAME}:{len(self.written)}"
+            self.written[playlist_id] = []
+        return playlist_id
+
+    def __add_songs_to_playlist(self, playlist_id, song_ids):
+        self.__request("add_songs_to_playlist")
+        with self.__lock:
+            self.written[playlist_id].extend(song_ids)
+
+    def __add_songs_to_liked_songs(self, song_ids):
+        self.__request("add_songs_to_liked_songs")
+        with self.__lock:
+            self.liked.extend(song_ids)
+
+    def __get_all_playlists(self):
+        self.__request("get_all_playlists")
+        return [
+            Playlist(
+                id=playlist_id,
+                name=playlist_id,
+                description="",
+                track_count=len(songs),
+                change_token=str(zlib.crc32(" ".join(s.id for s in songs).encode())),
+            )
+            for playlist_id, songs in self.library.playlists.items()
+        ]
+
+    def __get_playlist_songs(self, playlist_id):
+        self.__request("get_playlist_songs")
+        return list(self.library.playlists.get(playlist_id, []))
+
+    def __search_songs(self, query, limit):
+        self.__request("search_songs")
+        return self.__by_title.get(normalize_text(query), [])[:limit]
+
+    def __search_song_by_isrc(self, isrc):
+        self.__request("search_song_by_isrc")
+        return self.__by_isrc.get(isrc)
+
+    def get_user_id(self):
+        return self._call(self.__get_user_id)
+
+    def create_playlist(self, name, description=""):
+        return self._call(self.__create_playlist, name, idempotent=False)
+
+    def add_songs_to_playlist(self, playlist_id, song_ids):
+        return self._call(
+            self.__add_songs_to_playlist, playlist_id, song_ids, idempotent=False
+        )
+
+    def add_song_to_playlist(self, playlist_id, song_id):
+        return self._call(
+            self.__add_songs_to_playlist, playlist_id, [song_id], idempotent=False
+        )
+
+    def get_all_playlists(self):
+        return self._call(self.__get_all_playlists)
+
+    def get_playlist_songs(self, playlist_id):
+        return self._call(self.__get_playlist_songs, playlist_id)
+
+    def get_liked_songs(self):
+        return []
+
+    def add_song_to_liked_songs(self, song_id):
+        return self._call(self.__add_songs_to_liked_songs, [song_id])
+
+    def add_songs_to_liked_songs(self, song_ids):
+        return self._call(self.__add_songs_to_liked_songs, song_ids)
+
+    def search_songs(self, query, artist, limit):
+        return self._call(self.__search_songs, query, limit)
+
+    def __search_by_text(self, query, artist, limit):
+        return self._call(self.__search_songs, f"{query} {artist}", limit)
+
+    def search_strategies(self):
+        # Searches only match whole titles, so the free-text strategy never
+        # finds anything, as a query shape a service does not understand would
+        return {"title_artist": self.__search_by_text}
+
+    def fallback_strategies(self):
+        return {"title": self.search_songs}
+
+    def search_song(self, query, artist):
+        songs = self.search_songs(query, artist, 1)
+        if songs:
+            return songs[0]
+
+    def search_song_by_isrc(self, isrc):
+        return self._call(self.__search_song_by_isrc, isrc)
@@ -0,0 +1,131 @@
+import json
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
+
+from music_services.music_service import Song
+
+# Events logged once per song, which can be sampled on large transfers.
+# Songs that are not found are warnings and are always logged.
+SONG_EVENTS = {"song_search", "song_match", "song_present"}
+
+# Attributes every LogRecord has, so anything else was passed through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def song_event(
+    event: str, context: str, song: Song, match: Optional[Song] = None
+) -> Dict[str, Any]:
+    """
+    Builds the structured fields of a per-song event, to be logged as `extra`.
+
+    Args:
+        event (str): The name of the event, e.g. "song_match".
+        context (str): Where the song is being transferred, e.g. the playlist.
+        song (Song): The origin song.
+        match (Optional[Song]): The destination song it was matched to.
+
+    Returns:
+        Dict[str, Any]: The fields of the event.
+    """
+    fields = {
+        "event": event,
+        "context": context,
+        "song": song.id,
+        "title": song.name,
+        "artist": song.artist,
+    }
+    if match:
+        fields["match"] = match.id
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON lines. The fields passed through `extra`, such as
+    the "event" name, are included next to the time, level and message.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        event: Dict[str, Any] = {
+            "time": record.created,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        event.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            event["exception"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str)
+
+
+class SongSamplingFilter(logging.Filter):
+    """
+    Lets through `rate` of the per-song events, evenly spread, and every
+    other record.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+
+        self.rate = rate
+        self.__seen = 0
+        self.__lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "event", None) not in SONG_EVENTS:
+            return True
+
+        with self.__lock:
+            self.__seen += 1
+            seen = self.__seen
+        return int(seen * self.rate) != int((seen - 1) * self.rate)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener's thread. The default
+    handler formats every record before queueing it, on the caller's thread.
+    Records stay in this process, so they do not need to be made picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def start_logging(
+    loggers: List[logging.Logger],
+    handlers: List[logging.Handler],
+    song_sample_rate: float = 1.0,
+) -> QueueListener:
+    """
+    Sends the records of loggers to handlers running on a background thread,
+    so that slow handlers such as files do not block the threads logging.
+
+    Args:
+        loggers (List[logging.Logger]): The loggers whose records are handled.
+        handlers (List[logging.Handler]): The handlers that write the records.
+        song_sample_rate (float): Fraction of the per-song events logged.
+
+    Returns:
+        QueueListener: The listener writing the records. Stopping it writes
+            the records still queued.
+    """
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    if song_sample_rate < 1:
+        # Dropped before being queued, so sampled out events cost nothing more
+        handler.addFilter(SongSamplingFilter(song_sample_rate))
+    for logger in loggers:
+        logger.addHandler(handler)
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
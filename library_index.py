@@ -0,0 +1,121 @@
+import logging
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from music_services.music_service import MusicService, Song
+from music_services.normalization import normalize_song_key, normalize_text
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", normalize_text(text))
+
+
+class LibraryIndex:
+    """
+    In-memory index of the songs already in the destination user's library,
+    so that songs the user already has are matched without a remote search.
+
+    Songs are indexed by ISRC, by normalized title and artist, and by title
+    token in an inverted index. candidates() only narrows the library down to
+    similar songs; picking one is left to the caller's scoring.
+    """
+
+    def __init__(self) -> None:
+        self.__songs: List[Song] = []
+        self.__by_isrc: Dict[str, Song] = {}
+        self.__by_key: Dict[Tuple[str, str], Song] = {}
+        self.__postings: Dict[str, List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.__songs)
+
+    def add(self, song: Song) -> None:
+        key = normalize_song_key(song.name, song.artist)
+        if key in self.__by_key:
+            return
+
+        self.__by_key[key] = song
+        if song.isrc:
+            self.__by_isrc.setdefault(song.isrc, song)
+
+        index = len(self.__songs)
+        self.__songs.append(song)
+        for token in set(tokenize(song.name)):
+            self.__postings[token].append(index)
+
+    def add_all(self, songs: Iterable[Song]) -> None:
+        for song in songs:
+            self.add(song)
+
+    @classmethod
+    def build(
+        cls, service: MusicService, logger: Optional[logging.Logger] = None
+    ) -> "LibraryIndex":
+        """
+        Indexes the liked songs and the songs of every playlist of a user.
+
+        Args:
+            service (MusicService): The music service whose library is indexed.
+            logger (Optional[logging.Logger]): Logger for progress messages.
+
+        Returns:
+            LibraryIndex: The index of the user's library.
+        """
+        index = cls()
+        index.add_all(service.iter_liked_songs())
+        for playlist in service.get_all_playlists():
+            songs = service.iter_playlist_songs(playlist.id)
+            if songs is None:
+                if logger:
+                    logger.warning(f"Could not index playlist {playlist.name}")
+                continue
+            index.add_all(songs)
+
+        if logger:
+            logger.info(
+                f"Indexed {len(index)} songs from your {service.pretty_name()} library"
+            )
+        return index
+
+    def find_exact(self, song: Song) -> Optional[Song]:
+        """
+        Looks up a song with the same ISRC, or the same normalized title and
+        artist.
+
+        Args:
+            song (Song): The origin song.
+
+        Returns:
+            Optional[Song]: The song in the library, if any.
+        """
+        if song.isrc and song.isrc in self.__by_isrc:
+            return self.__by_isrc[song.isrc]
+        return self.__by_key.get(normalize_song_key(song.name, song.artist))
+
+    def candidates(self, song: Song, limit: int) -> List[Song]:
+        """
+        Finds the library songs sharing the most title tokens with a song.
+
+        Args:
+            song (Song): The origin song.
+            limit (int): The maximum number of songs to return.
+
+        Returns:
+            List[Song]: Songs sharing at least half of the title's tokens, most
+                shared tokens first.
+        """
+        tokens = set(tokenize(song.name))
+        if not tokens:
+            return []
+
+        shared: Counter = Counter()
+        for token in tokens:
+            shared.update(self.__postings.get(token, ()))
+
+        needed = (len(tokens) + 1) // 2
+        return [
+            self.__songs[index]
+            for index, count in shared.most_common(limit)
+            if count >= needed
+        ]
@@ -1,23 +1,25 @@
 import argparse
+import atexit
 import logging
 import sys
-from typing import Iterable, List, Sequence, Set, Tuple, Type
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
 
-from music_services.deezer_service import DeezerService
+from event_log import JsonFormatter, start_logging
+from library_index import LibraryIndex
+from match_cache import MatchCache
+from metrics import Metrics
+from music_services.file_service import FileService
 from music_services.music_service import MusicService
-from music_services.spotify_service import SpotifyService
-from music_services.ytmusic_service import YoutubeMusicService
+from music_services.registry import LazyService, get_services
 from playlist_transfer import PlaylistTransferer
+from transfer_journal import TransferJournal
+from transfer_scheduler import TransferScheduler
 
 
 def main():
     global LOGGER
 
-    services = [
-        SpotifyService,
-        YoutubeMusicService,
-        DeezerService,
-    ]
+    services = get_services()
 
     args = parse_args(
         from_opts=[s.arg_name() for s in services],
@@ -40,6 +42,17 @@ def main():
         origin = choose_service(services)
     LOGGER.info(f"Chosen origin: {origin.pretty_name()}")
 
+    if args.export_snapshot:
+        (origin,) = initialize_services(args, origin)
+        LOGGER.info(
+            f"Exporting {origin.pretty_name()} library to {args.export_snapshot}"
+        )
+        counts = FileService.export(origin, args.export_snapshot)
+        LOGGER.info(
+            f"Exported {counts['playlists']} playlists and {counts['songs']} songs"
+        )
+        return
+
     if not destination:
         available_destinations = [
             s
@@ -52,26 +65,94 @@ def main():
     LOGGER.info(f"Chosen destination: {destination.pretty_name()}")
 
     LOGGER.debug("Initializing music services")
-    origin, destination = initialize_services(origin, destination)
+    origin, destination = initialize_services(args, origin, destination)
+    metrics = Metrics()
+    origin, destination = metrics.instrument(origin), metrics.instrument(destination)
 
     origin_playlists = (
         origin.get_all_playlists() if user_used_cli_args else choose_playlists(origin)
     )
+    transfer_liked = (
+        args.liked
+        if user_used_cli_args
+        else confirm("\nDo you want to import your liked songs?")
+    )
+
+    cache = None if args.no_cache else MatchCache(args.cache)
+    # Nothing is written during a dry-run, so there is nothing to resume
+    journal = (
+        None
+        if args.dry
+        else TransferJournal(
+            args.journal, origin.arg_name(), destination.arg_name(), args.resume
+        )
+    )
+    index = LibraryIndex.build(destination, LOGGER) if args.index_library else None
+    playlist_transferer = PlaylistTransferer(
+        origin,
+        destination,
+        LOGGER,
+        args.dry,
+        workers=args.workers,
+        cache=cache,
+        journal=journal,
+        sync=args.sync,
+        remove_extras=args.remove_extras,
+        index=index,
+        skip_unchanged=not args.full_sync,
+    )
+    scheduler = TransferScheduler(
+        playlist_transferer,
+        parallel_playlists=args.parallel_playlists,
+        prefetch=args.prefetch,
+    )
+    for result in scheduler.run(origin_playlists):
+        playlist = result.playlist
+        if result.error:
+            LOGGER.error(f"Failed importing {playlist.name}: {result.error}")
+            continue
+
+        if result.not_match:
+            enumerated_not_match = get_enumerated_elements(
+                [s.name for s in result.not_match]
+            )
+            LOGGER.info(
+                f"These songs were not found or could not be added to {playlist.name}:\n{enumerated_not_match}"
+            )
+
+        LOGGER.info(f"Finished importing {playlist.name}")
 
-    playlist_transferer = PlaylistTransferer(origin, destination, LOGGER, args.dry)
-    for playlist in origin_playlists:
+    if transfer_liked:
         LOGGER.info(
-            f"--- Importing PLAYLIST {playlist.name} FROM {origin.pretty_name()} TO {destination.pretty_name()} ---"
+            f"--- Importing LIKED SONGS FROM {origin.pretty_name()} TO {destination.pretty_name()} ---"
         )
 
-        not_match = playlist_transferer.transfer_playlist(playlist)
+        not_match = playlist_transferer.transfer_liked_songs()
         if not_match:
             enumerated_not_match = get_enumerated_elements([s.name for s in not_match])
             LOGGER.info(
-                f"These songs were not found and were not added to {playlist.name}:\n{enumerated_not_match}"
+                f"These songs were not found or could not be added to liked songs:\n{enumerated_not_match}"
             )
 
-        LOGGER.info(f"Finished importing {playlist.name}")
+        LOGGER.info("Finished importing liked songs")
+
+    playlist_transferer.close()
+    if journal:
+        journal.close()
+
+    report = metrics.report(cache, playlist_transferer.matcher.deduplicated)
+    for line in Metrics.summarize(report):
+        LOGGER.info(line)
+    if index:
+        LOGGER.info(
+            f"Songs matched from your library: {playlist_transferer.matcher.found_in_library}"
+        )
+    if args.metrics:
+        Metrics.write_json(report, args.metrics)
+    if args.metrics_prometheus:
+        Metrics.write_prometheus(report, args.metrics_prometheus)
+    if cache:
+        cache.close()
 
 
 def get_enumerated_elements(elements: Iterable[str]) -> str:
@@ -104,30 +185,46 @@ def choose_option(options: Sequence[str]):
     return int(chosen) - 1
 
 
-def choose_service(services: List[Type[MusicService]]) -> Type[MusicService]:
+def confirm(question: str) -> bool:
+    answer = input(f"{question} (y/N): ").strip().lower()
+    return answer in ["y", "yes"]
+
+
+def choose_service(services: List[LazyService]) -> LazyService:
     service_options = [s.pretty_name() for s in services]
     chosen_idx = choose_option(service_options)
     return services[chosen_idx]
 
 
-def get_services_with_auth(
-    services: List[Type[MusicService]],
-) -> List[Type[MusicService]]:
+def get_services_with_auth(services: List[LazyService]) -> List[LazyService]:
     return [s for s in services if s.has_auth()]
 
 
-def initialize_services(*services: Type[MusicService]) -> List[MusicService]:
+def initialize_services(
+    args: argparse.Namespace, *services: LazyService
+) -> List[MusicService]:
+    # Imported here so that requests stays off the CLI's startup path
+    from music_services.http_session import PooledSession
+
+    # Every search worker, and the fetches and writes of every playlist being
+    # transferred, may have a request in flight at once
+    PooledSession.configure(args.workers + 2 * args.parallel_playlists)
+
     initialized = []
     for service in services:
         print(
-            f"\nInitializing {service.__name__}..." + " Please, authenticate"
+            f"\nInitializing {service.pretty_name()}..." + " Please, authenticate"
             if service.has_auth()
             else ""
         )
         try:
-            initialized.append(service())
+            service_class = service.load()
+            if service_class is FileService:
+                initialized.append(FileService(args.snapshot))
+            else:
+                initialized.append(service_class())
         except Exception as e:
-            LOGGER.critical(f"Error initializing {service.__name__}: {e}")
+            LOGGER.critical(f"Error initializing {service.pretty_name()}: {e}")
             sys.exit(1)
     return initialized
 
@@ -176,11 +273,24 @@ def get_logger(args: argparse.Namespace) -> logging.Logger:
     file_handler.setFormatter(formatter)
     stdout_handler = logging.StreamHandler(sys.stdout)
 
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging_level)
-    logger.addHandler(file_handler)
+    handlers: List[logging.Handler] = [file_handler]
     if args.logs:
-        logger.addHandler(stdout_handler)
+        handlers.append(stdout_handler)
+    if args.events:
+        events_handler = logging.FileHandler(args.events)
+        events_handler.setLevel(logging_level)
+        events_handler.setFormatter(JsonFormatter())
+        handlers.append(events_handler)
+
+    logger = logging.getLogger(__name__)
+    # The music services log throttling and retries under their own package
+    services_logger = logging.getLogger("music_services")
+    for each in [logger, services_logger]:
+        each.setLevel(logging_level)
+    # Records are written on a background thread, so that logging every song
+    # does not slow down the transfer. Queued records are written on exit.
+    listener = start_logging([logger, services_logger], handlers, args.sample_songs)
+    atexit.register(listener.stop)
 
     return logger
 
@@ -188,13 +298,25 @@ def get_logger(args: argparse.Namespace) -> logging.Logger:
 def validate_args(args: argparse.Namespace) -> None:
     if args.origin and args.origin == args.to:
         raise ValueError("Origin and destination services cannot be the same")
+    if args.workers < 1:
+        raise ValueError("--workers must be at least 1")
+    if args.parallel_playlists < 1:
+        raise ValueError("--parallel-playlists must be at least 1")
+    if args.prefetch < 0:
+        raise ValueError("--prefetch cannot be negative")
+    if args.remove_extras and not args.sync:
+        raise ValueError("--remove-extras can only be used with --sync")
+    if not 0 <= args.sample_songs <= 1:
+        raise ValueError("--sample-songs must be between 0 and 1")
+    if args.full_sync and not args.sync:
+        raise ValueError("--full-sync can only be used with --sync")
 
 
 def get_services_from_args(
-    args: argparse.Namespace, services: List[Type[MusicService]]
-) -> Tuple[Type[MusicService], Type[MusicService]]:
-    origin = next(s for s in services if s.arg_name() == args.origin)
-    destination = next(s for s in services if s.arg_name() == args.to)
+    args: argparse.Namespace, services: List[LazyService]
+) -> Tuple[Optional[LazyService], Optional[LazyService]]:
+    origin = next((s for s in services if s.arg_name() == args.origin), None)
+    destination = next((s for s in services if s.arg_name() == args.to), None)
     return origin, destination
 
 
@@ -210,11 +332,94 @@ def parse_args(from_opts: List[str], to_opts: List[str]) -> argparse.Namespace:
     parser.add_argument("--to", choices=to_opts, help="music service to import to")
     parser.add_argument("--debug", action="store_true", help="set log level to debug")
     parser.add_argument("--logs", action="store_true", help="redirect logs to stdout")
+    parser.add_argument(
+        "--events", help="file where logs are also written as JSON lines"
+    )
+    parser.add_argument(
+        "--sample-songs",
+        type=float,
+        default=1.0,
+        help="fraction of the per-song log lines written (default: 1)",
+    )
     parser.add_argument(
         "--dry",
         action="store_true",
         help="do not actually transfer the playlists. logs are still shown",
     )
+    parser.add_argument("--liked", action="store_true", help="also import liked songs")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="only add songs missing from playlists already in the destination",
+    )
+    parser.add_argument(
+        "--remove-extras",
+        action="store_true",
+        help="with --sync, also remove songs that are not in the origin playlist",
+    )
+    parser.add_argument(
+        "--full-sync",
+        action="store_true",
+        help="with --sync, also fetch playlists that did not change since the last sync",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of songs searched concurrently in the destination (default: 8)",
+    )
+    parser.add_argument(
+        "--parallel-playlists",
+        type=int,
+        default=4,
+        help="number of playlists imported at the same time (default: 4)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="number of upcoming playlists fetched from the origin in advance (default: 2)",
+    )
+    parser.add_argument(
+        "--index-library",
+        action="store_true",
+        help="match songs already in your destination library without searching",
+    )
+    parser.add_argument(
+        "--cache",
+        default="open_tune_transfer_cache.db",
+        help="file where song matches are cached across runs",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not read or write the match cache"
+    )
+    parser.add_argument(
+        "--journal",
+        default="open_tune_transfer_journal.jsonl",
+        help="file where the progress of transfers is recorded. Synced playlists"
+        + " are remembered next to it, in a .state.json file",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="resume the last run, skipping playlists and songs already imported",
+    )
+
+    parser.add_argument(
+        "--snapshot", help="snapshot file to import from when using --from file"
+    )
+    parser.add_argument(
+        "--export-snapshot",
+        metavar="PATH",
+        help="save the origin library to a snapshot file instead of importing it",
+    )
+    parser.add_argument(
+        "--metrics", help="file where a JSON report of API calls is written"
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        help="file where the report is written in Prometheus text format",
+    )
 
     return parser.parse_args()
 
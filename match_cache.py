@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, Optional, Tuple
+
+from music_services.music_service import Song
+from music_services.normalization import normalize_song_key
+
+DAY = 24 * 60 * 60
+
+
+class MatchCache:
+    """
+    Persistent SQLite cache of song matches, keyed by destination service and
+    normalized title and artist. Misses are stored too, so songs that are not
+    available in the destination are not searched again until they expire.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 30 * DAY,
+        negative_ttl: float = 1 * DAY,
+        max_entries: int = 100_000,
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS matches (
+                service TEXT NOT NULL,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                song TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (service, title, artist)
+            )
+            """
+        )
+        self.__conn.execute(
+            "CREATE INDEX IF NOT EXISTS matches_accessed_at ON matches (accessed_at)"
+        )
+        self.__conn.commit()
+        self.__size = self.__conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    @staticmethod
+    def __key(service: str, title: str, artist: str) -> Tuple[str, str, str]:
+        return (service, *normalize_song_key(title, artist))
+
+    def get(self, service: str, title: str, artist: str) -> Tuple[bool, Optional[Song]]:
+        """
+        Looks up a cached match.
+
+        Args:
+            service (str): The arg_name() of the destination service.
+            title (str): The title of the origin song.
+            artist (str): The artist of the origin song.
+
+        Returns:
+            Tuple[bool, Optional[Song]]: Whether a live entry was found, and the
+                cached match (None for a cached miss).
+        """
+        key = MatchCache.__key(service, title, artist)
+        now = time.time()
+
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT song, stored_at FROM matches"
+                " WHERE service = ? AND title = ? AND artist = ?",
+                key,
+            ).fetchone()
+
+            if row is not None:
+                song, stored_at = row
+                ttl = self.ttl if song is not None else self.negative_ttl
+                if now - stored_at <= ttl:
+                    self.__conn.execute(
+                        "UPDATE matches SET accessed_at = ?"
+                        " WHERE service = ? AND title = ? AND artist = ?",
+                        (now, *key),
+                    )
+                    self.__conn.commit()
+                    self.hits += 1
+                    return True, Song(**json.loads(song)) if song else None
+
+            self.misses += 1
+            return False, None
+
+    def put(self, service: str, title: str, artist: str, match: Optional[Song]) -> None:
+        """
+        Stores a match, or a miss when match is None.
+
+        Args:
+            service (str): The arg_name() of the destination service.
+            title (str): The title of the origin song.
+            artist (str): The artist of the origin song.
+            match (Optional[Song]): The matched destination song, if any.
+        """
+        key = MatchCache.__key(service, title, artist)
+        song = json.dumps(asdict(match)) if match else None
+        now = time.time()
+
+        with self.__lock:
+            inserted = self.__conn.execute(
+                "INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, song, now, now),
+            ).rowcount
+            if not inserted:
+                self.__conn.execute(
+                    "UPDATE matches SET song = ?, stored_at = ?, accessed_at = ?"
+                    " WHERE service = ? AND title = ? AND artist = ?",
+                    (song, now, now, *key),
+                )
+
+            self.__size += inserted
+            if self.__size > self.max_entries:
+                self.__evict()
+            self.__conn.commit()
+
+    def __evict(self) -> None:
+        # Evict a tenth of the cache at once so that eviction does not run on
+        # every insertion once the cache is full
+        self.__conn.execute(
+            "DELETE FROM matches WHERE rowid IN"
+            " (SELECT rowid FROM matches ORDER BY accessed_at LIMIT ?)",
+            (self.__size - self.max_entries + self.max_entries // 10,),
+        )
+        self.__size = self.__conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": self.__size}
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,315 @@
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from match_cache import MatchCache
+from music_services.music_service import MusicService
+from music_services.query_planner import QueryPlanner
+from music_services.rate_limiter import RateLimiter
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# Methods describing the service, which never call its API
+METADATA_METHODS = {"has_auth", "pretty_name", "arg_name", "capabilities"}
+PROMETHEUS_PREFIX = "open_tune_transfer"
+
+
+@dataclass
+class MethodMetrics:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    # Calls per latency bucket, with one last bucket for slower calls
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def observe(self, seconds: float, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.seconds += seconds
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        self.buckets[bucket] += 1
+
+
+class InstrumentedService:
+    """
+    Wraps a MusicService, recording the latency and outcome of every call to
+    its methods. Iterables returned by the iter_* methods are timed until they
+    are exhausted. Anything else is passed through to the wrapped service.
+    """
+
+    def __init__(self, service: MusicService, metrics: "Metrics") -> None:
+        self.service = service
+        self.metrics = metrics
+
+    def __timed(self, method: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        service = self.service.arg_name()
+
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.metrics.observe(service, method, time.perf_counter() - start, True)
+                raise
+
+            if method.startswith("iter_") and result is not None:
+                return self.__timed_iterator(
+                    service, method, iter(result), time.perf_counter() - start
+                )
+            self.metrics.observe(service, method, time.perf_counter() - start, False)
+            return result
+
+        return wrapper
+
+    def __timed_iterator(
+        self, service: str, method: str, iterator: Iterator[Any], elapsed: float
+    ) -> Iterator[Any]:
+        failed = True
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    failed = False
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            self.metrics.observe(service, method, elapsed, failed)
+
+    def __timed_strategies(self, method: str) -> Callable[[], Dict[str, Any]]:
+        # Strategies are timed separately, as search_songs[<strategy>]
+        def strategies() -> Dict[str, Any]:
+            return {
+                strategy: self.__timed(f"search_songs[{strategy}]", search)
+                for strategy, search in getattr(self.service, method)().items()
+            }
+
+        return strategies
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ["search_strategies", "fallback_strategies"]:
+            return self.__timed_strategies(name)
+        attribute = getattr(self.service, name)
+        if name.startswith("_") or name in METADATA_METHODS or not callable(attribute):
+            return attribute
+        return self.__timed(name, attribute)
+
+
+class Metrics:
+    """
+    Collects per-method call metrics of instrumented music services and
+    builds the end-of-run report, together with the retries and throttling
+    counted by the rate limiters and the match cache statistics.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__methods: Dict[Tuple[str, str], MethodMetrics] = {}
+
+    def instrument(self, service: MusicService) -> MusicService:
+        """
+        Wraps a music service so that every call to it is recorded.
+
+        Args:
+            service (MusicService): The music service to instrument.
+
+        Returns:
+            MusicService: The instrumented music service.
+        """
+        return InstrumentedService(service, self)  # type: ignore[return-value]
+
+    def observe(self, service: str, method: str, seconds: float, failed: bool) -> None:
+        with self.__lock:
+            key = (service, method)
+            if key not in self.__methods:
+                self.__methods[key] = MethodMetrics()
+            self.__methods[key].observe(seconds, failed)
+
+    def report(
+        self, cache: Optional[MatchCache] = None, deduplicated: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Builds a machine-readable report of the run.
+
+        Args:
+            cache (Optional[MatchCache]): The match cache used by the run.
+            deduplicated (int): Songs matched without searching again.
+
+        Returns:
+            Dict[str, Any]: The report, which can be serialized as JSON.
+        """
+        services: Dict[str, Dict[str, Any]] = {}
+        with self.__lock:
+            for (service, method), metrics in sorted(self.__methods.items()):
+                methods = services.setdefault(service, {"methods": {}})["methods"]
+                methods[method] = {
+                    "calls": metrics.calls,
+                    "errors": metrics.errors,
+                    "seconds": metrics.seconds,
+                    "latency_buckets": dict(
+                        zip(
+                            [str(b) for b in LATENCY_BUCKETS] + ["+Inf"],
+                            metrics.buckets,
+                        )
+                    ),
+                }
+
+        for name, limiter in RateLimiter.all().items():
+            services.setdefault(name, {"methods": {}}).update(
+                {
+                    "requests": limiter.calls,
+                    "retries": limiter.retries,
+                    "throttles": limiter.throttles,
+                    "errors": limiter.errors,
+                    "rate": limiter.rate,
+                }
+            )
+
+        for name, planner in QueryPlanner.all().items():
+            services.setdefault(name, {"methods": {}})["strategies"] = planner.stats()
+
+        # Imported here so that requests stays off the CLI's startup path
+        from music_services.http_session import PooledSession
+
+        for name, session in PooledSession.all().items():
+            services.setdefault(name, {"methods": {}})["pool"] = session.stats()
+
+        return {
+            "services": services,
+            "cache": cache.stats() if cache else None,
+            "deduplicated": deduplicated,
+        }
+
+    @staticmethod
+    def summarize(report: Dict[str, Any]) -> List[str]:
+        """
+        Summarizes a report in a few human-readable lines.
+
+        Args:
+            report (Dict[str, Any]): A report built by report().
+
+        Returns:
+            List[str]: One line per service, then one for the cache.
+        """
+        lines = []
+        for name, service in report["services"].items():
+            methods = service["methods"]
+            calls = sum(m["calls"] for m in methods.values())
+            seconds = sum(m["seconds"] for m in methods.values())
+            slowest = sorted(
+                methods.items(), key=lambda item: item[1]["seconds"], reverse=True
+            )[:3]
+            breakdown = ", ".join(
+                f"{method} {m['calls']} calls {m['seconds']:.1f}s"
+                for method, m in slowest
+            )
+            line = (
+                f"{name}: {calls} calls in {seconds:.1f}s ({breakdown}),"
+                + f" {service.get('retries', 0)} retries,"
+                + f" {service.get('throttles', 0)} throttled,"
+                + f" {service.get('errors', 0)} errors"
+            )
+            if "pool" in service:
+                pool = service["pool"]
+                line += (
+                    f", {pool['connections']} connections"
+                    + f" for {pool['requests']} HTTP requests"
+                )
+            if service.get("strategies"):
+                line += ", search strategies " + ", ".join(
+                    f"{strategy} {s['hits']}/{s['attempts']} matched"
+                    for strategy, s in service["strategies"].items()
+                )
+            lines.append(line)
+
+        cache = report["cache"]
+        if cache:
+            lines.append(
+                f"Match cache: {cache['hits']} hits, {cache['misses']} misses,"
+                + f" {report['deduplicated']} repeated songs not searched again"
+            )
+        else:
+            lines.append(f"{report['deduplicated']} repeated songs not searched again")
+        return lines
+
+    @staticmethod
+    def write_json(report: Dict[str, Any], path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    @staticmethod
+    def to_prometheus(report: Dict[str, Any]) -> str:
+        """
+        Formats a report in the Prometheus text exposition format.
+
+        Args:
+            report (Dict[str, Any]): A report built by report().
+
+        Returns:
+            str: The metrics in Prometheus text format.
+        """
+        p = PROMETHEUS_PREFIX
+        # Every sample of a metric has to follow its TYPE line
+        families: Dict[str, Tuple[str, List[str]]] = {}
+
+        def add(metric: str, kind: str, sample: str) -> None:
+            families.setdefault(metric, (kind, []))[1].append(sample)
+
+        for name, service in report["services"].items():
+            for method, m in service["methods"].items():
+                labels = f'service="{name}",method="{method}"'
+                add(f"{p}_calls_total", "counter", f"{{{labels}}} {m['calls']}")
+                add(f"{p}_call_errors_total", "counter", f"{{{labels}}} {m['errors']}")
+
+                histogram = f"{p}_call_duration_seconds"
+                cumulative = 0
+                for bound, count in m["latency_buckets"].items():
+                    cumulative += count
+                    add(
+                        histogram,
+                        "histogram",
+                        f'_bucket{{{labels},le="{bound}"}} {cumulative}',
+                    )
+                add(histogram, "histogram", f"_sum{{{labels}}} {m['seconds']}")
+                add(histogram, "histogram", f"_count{{{labels}}} {m['calls']}")
+
+            for counter in ["requests", "retries", "throttles", "errors"]:
+                if counter in service:
+                    add(
+                        f"{p}_{counter}_total",
+                        "counter",
+                        f'{{service="{name}"}} {service[counter]}',
+                    )
+
+            for counter in ["connections", "requests"]:
+                if "pool" in service:
+                    add(
+                        f"{p}_pool_{counter}_total",
+                        "counter",
+                        f'{{service="{name}"}} {service["pool"][counter]}',
+                    )
+
+        cache = report["cache"]
+        if cache:
+            add(f"{p}_cache_hits_total", "counter", f" {cache['hits']}")
+            add(f"{p}_cache_misses_total", "counter", f" {cache['misses']}")
+        add(f"{p}_deduplicated_total", "counter", f" {report['deduplicated']}")
+
+        lines = []
+        for metric, (kind, samples) in families.items():
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(metric + sample for sample in samples)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def write_prometheus(report: Dict[str, Any], path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(Metrics.to_prometheus(report))
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+class PartialWriteError(Exception):
+    """
+    Raised when some songs of a bulk write could not be written. Every other
+    song was written.
+    """
+
+    def __init__(self, failed: Dict[str, Exception], total: int) -> None:
+        super().__init__(f"{len(failed)} of {total} songs could not be written")
+        self.failed = failed
+        self.total = total
+
+
+class ConcurrentWriter:
+    """
+    Emulates a bulk endpoint for services that can only write one song per
+    request, by running up to `concurrency` single-song requests at once.
+
+    The write function should go through the service's rate limiter, which
+    keeps the requests within the service's limits. A failed song does not
+    stop the others; failures are reported together once every song has been
+    attempted. Songs may be written in any order.
+    """
+
+    def __init__(self, write_one: Callable[[str], Any], concurrency: int) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.write_one = write_one
+        self.concurrency = concurrency
+
+    def write(self, song_ids: List[str]) -> None:
+        """
+        Writes every song.
+
+        Args:
+            song_ids (List[str]): The IDs of the songs to write.
+
+        Raises:
+            PartialWriteError: If any song could not be written.
+        """
+        if not song_ids:
+            return
+
+        failed: Dict[str, Exception] = {}
+        workers = min(self.concurrency, len(song_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                song_id: executor.submit(self.write_one, song_id)
+                for song_id in song_ids
+            }
+            for song_id, future in futures.items():
+                error = future.exception()
+                if error is not None:
+                    failed[song_id] = error
+
+        if failed:
+            raise PartialWriteError(failed, len(song_ids))
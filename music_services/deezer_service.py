@@ -1,6 +1,8 @@
 import deezer
+from deezer.exceptions import DeezerErrorResponse
 
-from .music_service import MusicService, Playlist, Song
+from .music_service import MusicService, Playlist, ServiceCapabilities, Song
+from .normalization import build_query, clean_artist, clean_title
 
 
 class DeezerService(MusicService):
@@ -20,6 +22,12 @@ class DeezerService(MusicService):
     def arg_name(cls):
         return "deezer"
 
+    @classmethod
+    def capabilities(cls):
+        # Deezer allows 50 requests every 5 seconds. ISRC search only matters
+        # for destinations, which Deezer cannot be without authentication.
+        return ServiceCapabilities(supports_isrc_search=True, requests_per_second=10.0)
+
     def __extract_playlist_info(self, playlist):
         return Playlist(
             id=playlist.id,
@@ -27,18 +35,31 @@ class DeezerService(MusicService):
             description=(
                 playlist.description if hasattr(playlist, "description") else ""
             ),
+            track_count=getattr(playlist, "nb_tracks", None),
+            change_token=getattr(playlist, "checksum", None),
         )
 
     def __extract_song_info(self, track):
+        # Reading a field the API did not send makes deezer-python fetch the
+        # whole track, so optional fields are read from the raw data instead.
+        # Playlist and Loved Tracks listings have no ISRC, and the API has no
+        # batched track lookup, so songs read from Deezer never have an ISRC:
+        # fetching one track per song would cost more than the searches the
+        # ISRC saves. Only tracks from search results or get_track have it.
+        fields = track.as_dict()
         return Song(
             id=track.id,
             name=track.title,
             artist=track.artist.name,
+            isrc=fields.get("isrc"),
+            duration=fields.get("duration"),
         )
 
     def __get_all_playlists(self):
-        user = self.client.get_user(user_id=self.__user_id)
-        return user.get_playlists()
+        user = self._call(self.client.get_user, user_id=self.__user_id)
+        # Listings are paginated lazily, so the pages have to be read inside
+        # the limited call for the requests to be rate limited and retried
+        return self._call(lambda: list(user.get_playlists()))
 
     def get_user_id(self):
         return self.__user_id
@@ -57,13 +78,15 @@ class DeezerService(MusicService):
         return [self.__extract_playlist_info(playlist) for playlist in playlists]
 
     def get_playlist_songs(self, playlist_id):
-        playlist = self.client.get_playlist(playlist_id)
+        playlist = self._call(self.client.get_playlist, playlist_id)
         return [self.__extract_song_info(track) for track in playlist.tracks]
 
     def get_liked_songs(self):
         for playlist in self.__get_all_playlists():
             if playlist.title == "Loved Tracks":
-                return [self.__extract_song_info(track) for track in playlist.tracks]
+                # Listed playlists have no tracks, so reading them would make
+                # deezer-python fetch the playlist outside the limited call
+                return self.get_playlist_songs(playlist.id)
         return []
 
     def add_song_to_liked_songs(self, song_id):
@@ -72,11 +95,43 @@ class DeezerService(MusicService):
     def add_songs_to_liked_songs(self, song_ids):
         raise NotImplementedError("Adding songs to liked songs is not supported.")
 
-    def search_song(self, query, artist):
-        results = self.client.search(query, artist=artist)
-        if results:
-            return self.__extract_song_info(results[0])
+    def search_song_by_isrc(self, isrc):
+        try:
+            track = self._call(self.client.get_track, f"isrc:{isrc}")
+        except DeezerErrorResponse:
+            # Unknown ISRCs are reported as an error instead of an empty result
+            return None
+        return self.__extract_song_info(track)
+
+    def __search(self, limit, *args, **kwargs):
+        # Results are paginated lazily, so slicing, which only fetches the
+        # first page, has to happen inside the limited call
+        results = self._call(lambda: self.client.search(*args, **kwargs)[:limit])
+        return [self.__extract_song_info(track) for track in results]
+
+    def __search_by_fields(self, query, artist, limit):
+        return self.__search(limit, clean_title(query), artist=clean_artist(artist))
+
+    def __search_by_text(self, query, artist, limit):
+        return self.__search(limit, build_query(query, artist))
 
-        results = self.client.search(f"{query} {artist}")
-        if results:
-            return self.__extract_song_info(results[0])
+    def __search_by_title(self, query, artist, limit):
+        return self.__search(limit, clean_title(query))
+
+    def search_songs(self, query, artist, limit):
+        songs = self.__search_by_fields(query, artist, limit)
+        return songs or self.__search_by_text(query, artist, limit)
+
+    def search_strategies(self):
+        return {
+            "structured": self.__search_by_fields,
+            "title_artist": self.__search_by_text,
+        }
+
+    def fallback_strategies(self):
+        return {"title": self.__search_by_title}
+
+    def search_song(self, query, artist):
+        songs = self.search_songs(query, artist, 1)
+        if songs:
+            return songs[0]
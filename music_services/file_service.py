@@ -0,0 +1,230 @@
+import gzip
+import json
+import os
+import time
+import zlib
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .music_service import MusicService, Playlist, Song
+
+CHUNK_SIZE = 64 * 1024
+
+
+class FileService(MusicService):
+    """
+    Reads a library snapshot written by FileService.export(), so that a slow
+    origin only has to be fetched once and can then be transferred any number
+    of times without calling its API.
+
+    A snapshot is a gzip-compressed JSONL file: a header, then every playlist
+    followed by its songs, and finally the liked songs. Every playlist is
+    compressed as a gzip member of its own, whose offset is recorded when the
+    snapshot is opened, so reading a playlist only decompresses that playlist.
+    Songs are read lazily, one playlist at a time.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or input("Snapshot file: ")
+        # Scanning the snapshot once up front avoids a scan per playlist just
+        # to list them, and fails early on files that are not snapshots
+        self.__header: Dict[str, Any] = {}
+        self.__playlists: List[Playlist] = []
+        # Offset of the gzip member each playlist starts in, by playlist ID
+        self.__offsets: Dict[Optional[str], int] = {}
+        try:
+            lines = list(self.__scan())
+        except zlib.error as e:
+            raise ValueError(f"{self.path} is not a library snapshot: {e}")
+
+        for offset, record in lines:
+            if record["type"] == "snapshot":
+                self.__header = record
+            elif record["type"] == "playlist":
+                self.__offsets.setdefault(record["id"], offset)
+            if record["type"] == "playlist" and record["id"] is not None:
+                self.__playlists.append(
+                    Playlist(
+                        id=record["id"],
+                        name=record["name"],
+                        description=record["description"],
+                        track_count=record["track_count"],
+                        change_token=record.get("change_token"),
+                    )
+                )
+
+        if not self.__header:
+            raise ValueError(f"{self.path} is not a library snapshot")
+
+    @classmethod
+    def has_auth(cls):
+        return False
+
+    @classmethod
+    def pretty_name(cls):
+        return "Snapshot file"
+
+    @classmethod
+    def arg_name(cls):
+        return "file"
+
+    @staticmethod
+    def __is_song(line: str) -> bool:
+        return line.startswith('{"type": "song"')
+
+    def __read_members(self, offset: int = 0) -> Iterator[Tuple[int, str]]:
+        """
+        Decompresses the snapshot from the gzip member starting at `offset`,
+        yielding every line with the offset of the member it belongs to.
+        """
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            decompressor = zlib.decompressobj(wbits=31)
+            pending = b""
+            while True:
+                data = file.read(CHUNK_SIZE)
+                if not data:
+                    break
+                data_offset = file.tell() - len(data)
+
+                while data:
+                    *lines, pending = (pending + decompressor.decompress(data)).split(
+                        b"\n"
+                    )
+                    for line in lines:
+                        yield offset, line.decode("utf-8")
+                    if not decompressor.eof:
+                        break
+
+                    # The next member starts with the data left over
+                    unused = decompressor.unused_data
+                    if pending:
+                        yield offset, pending.decode("utf-8")
+                        pending = b""
+                    offset = data_offset + len(data) - len(unused)
+                    data_offset, data = offset, unused
+                    decompressor = zlib.decompressobj(wbits=31)
+
+            if pending:
+                yield offset, pending.decode("utf-8")
+
+    def __scan(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        # Only the records other than songs are decoded
+        for offset, line in self.__read_members():
+            if line and not FileService.__is_song(line):
+                yield offset, json.loads(line)
+
+    def __iter_block(self, playlist_id: Optional[str]) -> Iterator[Song]:
+        if playlist_id not in self.__offsets:
+            return
+
+        # Snapshots written as a single gzip member are read from the start,
+        # until the playlist is found
+        in_block = False
+        for _, line in self.__read_members(self.__offsets[playlist_id]):
+            if not line:
+                continue
+            if FileService.__is_song(line):
+                if in_block:
+                    song = json.loads(line)
+                    del song["type"]
+                    yield Song(**song)
+                continue
+
+            record = json.loads(line)
+            if record["type"] == "playlist":
+                if in_block:
+                    return
+                in_block = record["id"] == playlist_id
+
+    @classmethod
+    def export(cls, service: MusicService, path: str) -> Dict[str, int]:
+        """
+        Writes the whole library of a music service to a snapshot file. Songs
+        are streamed to disk as they are fetched.
+
+        The snapshot is written to a temporary file first, so an interrupted
+        export never leaves a partial snapshot behind.
+
+        Args:
+            service (MusicService): The music service to export.
+            path (str): The file to write the snapshot to.
+
+        Returns:
+            Dict[str, int]: The number of playlists and songs exported.
+        """
+        counts = {"playlists": 0, "songs": 0}
+        temporary_path = f"{path}.partial"
+
+        def write_member(file, records: Iterable[Dict[str, Any]]) -> None:
+            # Each block is a gzip member of its own, so it can be read alone
+            with gzip.GzipFile(fileobj=file, mode="wb") as member:
+                for record in records:
+                    member.write((json.dumps(record) + "\n").encode("utf-8"))
+
+        def write_block(file, playlist: Dict[str, Any], songs) -> None:
+            def records() -> Iterator[Dict[str, Any]]:
+                yield {"type": "playlist", **playlist}
+                for song in songs:
+                    yield {"type": "song", **asdict(song)}
+                    counts["songs"] += 1
+
+            write_member(file, records())
+
+        with open(temporary_path, "wb") as file:
+            header = {
+                "type": "snapshot",
+                "service": service.arg_name(),
+                "created_at": time.time(),
+            }
+            write_member(file, [header])
+            for playlist in service.get_all_playlists():
+                songs = service.iter_playlist_songs(playlist.id)
+                if songs is None:
+                    raise ValueError(
+                        f"Could not retrieve songs from playlist {playlist.name}"
+                    )
+                write_block(file, asdict(playlist), songs)
+                counts["playlists"] += 1
+
+            liked = {"id": None, "name": "", "description": "", "track_count": None}
+            write_block(file, liked, service.iter_liked_songs())
+
+        os.replace(temporary_path, path)
+        return counts
+
+    def get_user_id(self):
+        return self.__header["service"]
+
+    def create_playlist(self, name, description=""):
+        raise NotImplementedError("Creating playlists is not supported.")
+
+    def add_songs_to_playlist(self, playlist_id, song_ids):
+        raise NotImplementedError("Adding songs to playlists is not supported.")
+
+    def add_song_to_playlist(self, playlist_id, song_id):
+        raise NotImplementedError("Adding a song to a playlist is not supported.")
+
+    def get_all_playlists(self):
+        return list(self.__playlists)
+
+    def get_playlist_songs(self, playlist_id):
+        return list(self.iter_playlist_songs(playlist_id))
+
+    def iter_playlist_songs(self, playlist_id):
+        return self.__iter_block(playlist_id)
+
+    def get_liked_songs(self):
+        return list(self.iter_liked_songs())
+
+    def iter_liked_songs(self):
+        return self.__iter_block(None)
+
+    def add_song_to_liked_songs(self, song_id):
+        raise NotImplementedError("Adding a song to liked songs is not supported.")
+
+    def add_songs_to_liked_songs(self, song_ids):
+        raise NotImplementedError("Adding songs to liked songs is not supported.")
+
+    def search_song(self, query, artist):
+        raise NotImplementedError("Searching songs is not supported.")
@@ -0,0 +1,86 @@
+import threading
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+
+class PooledSession(requests.Session):
+    """
+    HTTP session shared by every instance of a music service, which keeps
+    connections alive in a pool sized for the number of concurrent callers.
+    Reusing connections avoids a TCP and TLS handshake per request.
+
+    Retries are left to the rate limiter, so the adapters do not retry.
+    """
+
+    __pool_size = DEFAULT_POOL_SIZE
+    __sessions: Dict[str, "PooledSession"] = {}
+    __sessions_lock = threading.Lock()
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE) -> None:
+        super().__init__()
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    @classmethod
+    def configure(cls, pool_size: int) -> None:
+        """
+        Sets the pool size of the sessions created from now on. It should
+        match the number of requests a service may have in flight at once.
+
+        Args:
+            pool_size (int): The maximum number of connections kept per host.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        cls.__pool_size = pool_size
+
+    @classmethod
+    def for_service(cls, name: str) -> "PooledSession":
+        """
+        Returns the session shared by every instance of a music service.
+
+        Args:
+            name (str): The arg_name() of the music service.
+
+        Returns:
+            PooledSession: The shared session.
+        """
+        with cls.__sessions_lock:
+            if name not in cls.__sessions:
+                cls.__sessions[name] = cls(cls.__pool_size)
+            return cls.__sessions[name]
+
+    @classmethod
+    def all(cls) -> Dict[str, "PooledSession"]:
+        with cls.__sessions_lock:
+            return dict(cls.__sessions)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Counts the connections opened and the requests sent through them.
+
+        Returns:
+            Dict[str, int]: The pool size, and the number of connections,
+                requests, and requests that reused an open connection.
+        """
+        connections = requests_sent = 0
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests_sent += pool.num_requests
+
+        return {
+            "pool_size": self.pool_size,
+            "connections": connections,
+            "requests": requests_sent,
+            "reused": max(0, requests_sent - connections),
+        }
@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from .rate_limiter import RateLimiter
+
+T = TypeVar("T")
 
 
 @dataclass
@@ -8,6 +12,10 @@ class Song:
     id: str
     name: str
     artist: str
+    # International Standard Recording Code, if the service exposes it
+    isrc: Optional[str] = None
+    # Length of the song in seconds, if the service exposes it
+    duration: Optional[int] = None
 
 
 @dataclass
@@ -15,6 +23,29 @@ class Playlist:
     id: str
     name: str
     description: str
+    # Number of songs in the playlist, if the service reports it when listing
+    track_count: Optional[int] = None
+    # Value that changes whenever the songs of the playlist change, such as
+    # Spotify's snapshot ID, if the service reports it when listing
+    change_token: Optional[str] = None
+
+
+@dataclass
+class ServiceCapabilities:
+    # Whether add_songs_to_playlist() adds all songs in a single request
+    supports_bulk_add: bool = False
+    # Maximum number of songs accepted by a single add_songs_to_playlist() call
+    max_batch_size: int = 1
+    # Whether add_songs_to_liked_songs() likes all songs in a single request
+    supports_bulk_like: bool = False
+    # Maximum number of songs accepted by a single add_songs_to_liked_songs() call
+    max_like_batch_size: int = 1
+    # Single-song requests run at once when a bulk write has to be emulated
+    write_concurrency: int = 4
+    # Whether search_song_by_isrc() is supported
+    supports_isrc_search: bool = False
+    # Request rate the service is expected to accept without throttling
+    requests_per_second: float = 10.0
 
 
 class MusicService(ABC):
@@ -55,6 +86,43 @@ class MusicService(ABC):
         """
         pass
 
+    @classmethod
+    def capabilities(cls) -> ServiceCapabilities:
+        """
+        Describes what the service's write endpoints support.
+
+        Returns:
+            ServiceCapabilities: The capabilities of the music service.
+        """
+        return ServiceCapabilities()
+
+    def _call(
+        self,
+        func: Callable[..., T],
+        *args: Any,
+        idempotent: bool = True,
+        **kwargs: Any,
+    ) -> T:
+        """
+        Calls an API client function through the rate limiter shared by every
+        instance of the music service, retrying throttled and transient errors.
+
+        Args:
+            func (Callable[..., T]): The client function to call.
+            *args: Positional arguments for func.
+            idempotent (bool): Whether func can be repeated without effect.
+                Writes that are not, such as adding songs to a playlist, are
+                only retried when throttled or when the request was never sent.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            T: The value returned by func.
+        """
+        limiter = RateLimiter.for_service(
+            self.arg_name(), self.capabilities().requests_per_second
+        )
+        return limiter.call(func, *args, idempotent=idempotent, **kwargs)
+
     @abstractmethod
     def create_playlist(self, name: str, description: str) -> str:
         """
@@ -110,6 +178,19 @@ class MusicService(ABC):
         """
         pass
 
+    def remove_songs_from_playlist(self, playlist_id: str, song_ids: List[str]) -> None:
+        """
+        Removes every occurrence of the given songs from a specified playlist.
+
+        Args:
+            playlist_id (str): The ID of the playlist.
+            song_ids (List[str]): The list of song IDs to remove from the playlist.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError("Removing songs from playlists is not supported.")
+
     @abstractmethod
     def get_all_playlists(self) -> List[Playlist]:
         """
@@ -133,6 +214,22 @@ class MusicService(ABC):
         """
         pass
 
+    def iter_playlist_songs(self, playlist_id: str) -> Optional[Iterable[Song]]:
+        """
+        Streams the songs in a specified playlist.
+
+        Services with paginated endpoints should override this to yield songs
+        page by page, so that matching can start before the whole playlist has
+        been fetched. Defaults to get_playlist_songs().
+
+        Args:
+            playlist_id (str): The ID of the playlist.
+
+        Returns:
+            Optional[Iterable[Song]]: The songs in the specified playlist.
+        """
+        return self.get_playlist_songs(playlist_id)
+
     @abstractmethod
     def get_liked_songs(self) -> List[Song]:
         """
@@ -143,6 +240,18 @@ class MusicService(ABC):
         """
         pass
 
+    def iter_liked_songs(self) -> Iterable[Song]:
+        """
+        Streams all songs liked by the authenticated user.
+
+        Services with paginated endpoints should override this to yield songs
+        page by page. Defaults to get_liked_songs().
+
+        Returns:
+            Iterable[Song]: The liked songs.
+        """
+        return self.get_liked_songs()
+
     @abstractmethod
     def add_song_to_liked_songs(self, song_id: str) -> None:
         """
@@ -172,6 +281,68 @@ class MusicService(ABC):
         """
         pass
 
+    def search_songs(self, query: str, artist: str, limit: int) -> List[Song]:
+        """
+        Searches for the songs that best match a title and artist.
+
+        Services whose search endpoint returns several results should override
+        this, so that the best match can be picked among them. Defaults to the
+        single result of search_song().
+
+        Args:
+            query (str): The title of the song.
+            artist (str): The artist of the song.
+            limit (int): The maximum number of songs to return.
+
+        Returns:
+            List[Song]: The found songs, best match first.
+        """
+        song = self.search_song(query, artist)
+        return [song] if song else []
+
+    def search_strategies(self) -> Dict[str, Callable[[str, str, int], List[Song]]]:
+        """
+        Provides the different ways of searching for a song, such as a search
+        by title and artist or by title only. Each strategy takes the same
+        arguments as search_songs().
+
+        The query planner tries them in the order that has proven cheapest per
+        match, moving on when a strategy finds no match. The declaration order
+        is used until there are statistics. Defaults to search_songs() alone.
+
+        Strategies that ignore the artist should be declared as
+        fallback_strategies() instead.
+
+        Returns:
+            Dict[str, Callable[[str, str, int], List[Song]]]: The strategies,
+                by name.
+        """
+        return {"default": self.search_songs}
+
+    def fallback_strategies(self) -> Dict[str, Callable[[str, str, int], List[Song]]]:
+        """
+        Provides the search strategies tried only once every strategy from
+        search_strategies() found no match, such as a search by title only,
+        which finds songs of any artist. Defaults to none.
+
+        Returns:
+            Dict[str, Callable[[str, str, int], List[Song]]]: The strategies,
+                by name.
+        """
+        return {}
+
+    def search_song_by_isrc(self, isrc: str) -> Optional[Song]:
+        """
+        Looks up a song by its ISRC, which identifies a recording exactly.
+
+        Args:
+            isrc (str): The ISRC of the song.
+
+        Returns:
+            Optional[Song]: The details of the found song.
+        """
+        raise NotImplementedError("Searching songs by ISRC is not supported.")
+
     @abstractmethod
     def search_song(self, query: str, artist: str) -> Optional[Song]:
         """
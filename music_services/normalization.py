@@ -0,0 +1,113 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Tuple
+
+# Normalized strings are requested many times per song, by the searches,
+# the scorer and the caches, so results are memoized
+CACHE_SIZE = 65536
+
+# Tags that name an edition of the same recording, e.g. "(Remastered 2011)"
+# or "- Single Version". Remixes, live and acoustic versions are different
+# recordings, so they are kept.
+EDITION = (
+    r"(?:\d{4}\s+)?remaster(?:ed)?(?:\s+\d{4})?(?:\s+version)?"
+    r"|(?:mono|stereo)(?:\s+version)?"
+    r"|(?:single|album|original)\s+version"
+    r"|radio\s+edit|explicit|clean|bonus\s+track"
+    r"|(?:deluxe|\d+\w*\s+anniversary)(?:\s+edition)?"
+)
+# Brackets are only removed when they hold nothing but edition tags, so that
+# "(Live / Remastered 2011)" keeps "Live"
+EDITION_TAG = re.compile(
+    rf"\s*[\(\[]\s*(?:{EDITION})(?:\s*[/,&]\s*(?:{EDITION}))*\s*[\)\]]",
+    re.IGNORECASE,
+)
+EDITION_SUFFIX = re.compile(rf"\s+-\s+(?:{EDITION})\s*$", re.IGNORECASE)
+FEATURING_TAG = re.compile(
+    r"\s*[\(\[](?:feat\.?|ft\.?|featuring|with)\s[^\)\]]*[\)\]]", re.IGNORECASE
+)
+FEATURING_SUFFIX = re.compile(r"\s+(?:feat\.?|ft\.?|featuring)\s.*$", re.IGNORECASE)
+APOSTROPHES = re.compile(r"['’`]")
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a title or artist so equivalent strings compare equal.
+
+    Args:
+        text (str): The raw title or artist name.
+
+    Returns:
+        str: The text without accents, punctuation or case, and with collapsed
+            whitespace.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = PUNCTUATION.sub(" ", APOSTROPHES.sub("", text))
+    return " ".join(text.casefold().split())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_title(title: str) -> str:
+    """
+    Removes edition tags and featured artist credits from a title, which
+    services format differently and which make searches miss.
+
+    Args:
+        title (str): The raw title.
+
+    Returns:
+        str: The title of the song itself, e.g. "Yesterday" for
+            "Yesterday - Remastered 2009".
+    """
+    cleaned = title or ""
+    for rule in [EDITION_TAG, FEATURING_TAG, EDITION_SUFFIX, FEATURING_SUFFIX]:
+        cleaned = rule.sub("", cleaned)
+    # A title made only of tags is left as it was
+    return cleaned.strip() or (title or "").strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_artist(artist: str) -> str:
+    """
+    Removes featured artist credits from an artist name.
+
+    Args:
+        artist (str): The raw artist name.
+
+    Returns:
+        str: The main artist.
+    """
+    cleaned = FEATURING_SUFFIX.sub("", artist or "")
+    return cleaned.strip() or (artist or "").strip()
+
+
+def build_query(title: str, artist: str) -> str:
+    """
+    Builds a free-text search query for a song.
+
+    Args:
+        title (str): The title of the song.
+        artist (str): The artist of the song.
+
+    Returns:
+        str: The cleaned title and artist.
+    """
+    return f"{clean_title(title)} {clean_artist(artist)}".strip()
+
+
+def normalize_song_key(title: str, artist: str) -> Tuple[str, str]:
+    """
+    Builds a key under which the same song has the same value in any service.
+
+    Args:
+        title (str): The title of the song.
+        artist (str): The artist of the song.
+
+    Returns:
+        Tuple[str, str]: The normalized title and artist.
+    """
+    return normalize_text(title), normalize_text(artist)
@@ -0,0 +1,151 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Strategies are given the benefit of the doubt until they have been tried
+# this many times
+MIN_ATTEMPTS = 20
+# Strategies that match less often than this once tried enough are skipped...
+MIN_HIT_RATE = 0.05
+# ...except for one attempt in this many, so that they can recover
+EXPLORE_INTERVAL = 20
+
+
+@dataclass
+class StrategyStats:
+    attempts: int = 0
+    hits: int = 0
+    seconds: float = 0.0
+    # Searches in which the strategy was left out for matching too rarely
+    skipped: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        # Laplace smoothing, so that untried strategies start at 50%
+        return (self.hits + 1) / (self.attempts + 2)
+
+    @property
+    def latency(self) -> float:
+        return self.seconds / self.attempts if self.attempts else 0.0
+
+
+class QueryPlanner:
+    """
+    Orders the search strategies of a music service by their expected cost
+    per successful match, learned from the searches of the run.
+
+    A strategy is tried only when the ones before it did not find a match, so
+    its hit rate is the rate at which it rescues a search. Once every
+    strategy has been tried MIN_ATTEMPTS times, strategies are sorted by mean
+    latency over hit rate, which minimizes the expected time spent per song.
+    Until then, the declaration order is kept. Fallback strategies, such as
+    searches that ignore the artist, are always planned after the others.
+    Strategies that almost never match are skipped but retried once in a
+    while.
+
+    Planners are shared by every instance of a music service.
+    """
+
+    __planners: Dict[str, "QueryPlanner"] = {}
+    __planners_lock = threading.Lock()
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.__stats: Dict[str, StrategyStats] = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def for_service(cls, name: str) -> "QueryPlanner":
+        """
+        Returns the planner shared by every instance of a music service.
+
+        Args:
+            name (str): The arg_name() of the music service.
+
+        Returns:
+            QueryPlanner: The shared planner.
+        """
+        with cls.__planners_lock:
+            if name not in cls.__planners:
+                cls.__planners[name] = cls(name)
+            return cls.__planners[name]
+
+    @classmethod
+    def all(cls) -> Dict[str, "QueryPlanner"]:
+        with cls.__planners_lock:
+            return dict(cls.__planners)
+
+    def __cost(self, strategy: str) -> float:
+        stats = self.__stats.get(strategy, StrategyStats())
+        return stats.latency / stats.hit_rate
+
+    def __order(self, strategies: List[str]) -> List[str]:
+        if any(
+            self.__stats.get(s, StrategyStats()).attempts < MIN_ATTEMPTS
+            for s in strategies
+        ):
+            return list(strategies)
+        # Sorting is stable, so the declared order breaks ties
+        return sorted(strategies, key=self.__cost)
+
+    def __is_poor(self, strategy: str) -> bool:
+        stats = self.__stats.get(strategy, StrategyStats())
+        return (
+            stats.attempts >= MIN_ATTEMPTS
+            and stats.hits / stats.attempts < MIN_HIT_RATE
+        )
+
+    def plan(
+        self, strategies: List[str], fallbacks: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Orders strategies for the next search.
+
+        Args:
+            strategies (List[str]): The names of the strategies, in the order
+                declared by the music service.
+            fallbacks (Optional[List[str]]): The names of the strategies only
+                tried after every other one, in the order declared.
+
+        Returns:
+            List[str]: The strategies to try, cheapest first, then the
+                fallbacks. At least one strategy is always returned.
+        """
+        with self.__lock:
+            ordered = self.__order(strategies) + self.__order(fallbacks or [])
+            planned = []
+            for strategy in ordered:
+                if self.__is_poor(strategy):
+                    stats = self.__stats[strategy]
+                    stats.skipped += 1
+                    if stats.skipped % EXPLORE_INTERVAL != 0:
+                        continue
+                planned.append(strategy)
+        return planned or ordered[:1]
+
+    def record(self, strategy: str, hit: bool, seconds: float) -> None:
+        """
+        Records the outcome of a strategy.
+
+        Args:
+            strategy (str): The name of the strategy.
+            hit (bool): Whether the strategy found a match.
+            seconds (float): How long the search took.
+        """
+        with self.__lock:
+            stats = self.__stats.setdefault(strategy, StrategyStats())
+            stats.attempts += 1
+            stats.hits += hit
+            stats.seconds += seconds
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self.__lock:
+            return {
+                strategy: {
+                    "attempts": stats.attempts,
+                    "hits": stats.hits,
+                    "seconds": stats.seconds,
+                    "skipped": stats.skipped,
+                }
+                for strategy, stats in self.__stats.items()
+            }
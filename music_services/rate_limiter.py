@@ -0,0 +1,289 @@
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Deezer answers "Quota limit exceeded" with HTTP 200 and this error code
+DEEZER_QUOTA_ERROR_CODE = 4
+
+logger = logging.getLogger(__name__)
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """
+    Extracts the HTTP status code from an exception raised by a music service
+    client, if there is one.
+
+    Args:
+        error (Exception): The exception raised by the client.
+
+    Returns:
+        Optional[int]: The HTTP status code of the failed request.
+    """
+    # spotipy
+    status = getattr(error, "http_status", None)
+    if status is not None:
+        return status
+
+    # requests
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status
+
+    # deezer-python passes the status code of httpx errors as first argument,
+    # or the httpx error itself when the response has no body
+    deezer_errors = sys.modules.get("deezer.exceptions")
+    if deezer_errors and isinstance(error, deezer_errors.DeezerHTTPError):
+        source = error.args[0] if error.args else None
+        if isinstance(source, int):
+            return source
+        status = getattr(getattr(source, "response", None), "status_code", None)
+        if status is not None:
+            return status
+
+    json_data = getattr(error, "json_data", None)
+    if isinstance(json_data, dict):
+        code = json_data.get("error", {}).get("code")
+        if code == DEEZER_QUOTA_ERROR_CODE:
+            return 429
+
+    # ytmusicapi raises plain exceptions
+    found = re.match(r"Server returned HTTP (\d{3})", str(error))
+    return int(found.group(1)) if found else None
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Extracts the Retry-After delay, in seconds, from an exception raised by a
+    music service client, if the service sent one.
+
+    Args:
+        error (Exception): The exception raised by the client.
+
+    Returns:
+        Optional[float]: The number of seconds to wait before retrying.
+    """
+    headers = getattr(error, "headers", None) or getattr(
+        getattr(error, "response", None), "headers", None
+    )
+    if not headers:
+        return None
+
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+def was_not_sent(error: Exception) -> bool:
+    """
+    Checks whether a request failed before it reached the service, because no
+    connection could be established.
+
+    Args:
+        error (Exception): The exception raised by the client.
+
+    Returns:
+        bool: True if the service cannot have received the request.
+    """
+    # Imported here since only failed calls need them, and importing requests
+    # accounts for most of the CLI's startup time
+    import requests
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+
+    # httpx, used by deezer-python, is only loaded along with the service
+    httpx = sys.modules.get("httpx")
+    return bool(httpx) and isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    # A write may have been applied even if it failed, so it is only retried
+    # when the service refused it or never received it
+    if not idempotent:
+        return get_status_code(error) == 429 or was_not_sent(error)
+
+    import requests
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+
+    httpx = sys.modules.get("httpx")
+    if httpx and isinstance(error, (httpx.NetworkError, httpx.TimeoutException)):
+        return True
+    deezer_errors = sys.modules.get("deezer.exceptions")
+    if deezer_errors and isinstance(error, deezer_errors.DeezerRetryableException):
+        return True
+    return get_status_code(error) in RETRYABLE_STATUSES
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every caller of a music service.
+
+    The request rate starts at `max_rate` and adapts to the service: it is
+    halved whenever the service throttles a request and grows back slowly as
+    requests succeed. Retryable failures are retried with jittered exponential
+    backoff, and a Retry-After sent with a 429 pauses every caller.
+    """
+
+    __limiters: Dict[str, "RateLimiter"] = {}
+    __limiters_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str,
+        max_rate: float,
+        burst: int = 5,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ) -> None:
+        if max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+
+        self.name = name
+        self.max_rate = max_rate
+        self.min_rate = max_rate / 20
+        self.rate = max_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.calls = 0
+        self.retries = 0
+        self.throttles = 0
+        self.errors = 0
+
+        self.__lock = threading.Lock()
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__blocked_until = 0.0
+        self.__last_decrease = 0.0
+
+    @classmethod
+    def for_service(cls, name: str, max_rate: float) -> "RateLimiter":
+        """
+        Returns the rate limiter shared by every instance of a music service.
+
+        Args:
+            name (str): The arg_name() of the music service.
+            max_rate (float): The maximum number of requests per second.
+
+        Returns:
+            RateLimiter: The shared rate limiter.
+        """
+        with cls.__limiters_lock:
+            if name not in cls.__limiters:
+                cls.__limiters[name] = cls(name, max_rate)
+            return cls.__limiters[name]
+
+    @classmethod
+    def all(cls) -> Dict[str, "RateLimiter"]:
+        with cls.__limiters_lock:
+            return dict(cls.__limiters)
+
+    def acquire(self) -> None:
+        """Blocks until the caller is allowed to send a request."""
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(
+                self.burst, self.__tokens + (now - self.__updated) * self.rate
+            )
+            self.__updated = now
+            # Tokens may go negative, which reserves a slot in the future
+            self.__tokens -= 1
+            self.calls += 1
+            delay = max(-self.__tokens / self.rate, self.__blocked_until - now)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def __on_success(self) -> None:
+        with self.__lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def __on_throttled(self, retry_after: Optional[float]) -> None:
+        with self.__lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if retry_after is not None:
+                self.__blocked_until = max(self.__blocked_until, now + retry_after)
+
+            # Concurrent callers are usually throttled together, so the rate
+            # is only decreased once per second
+            if now - self.__last_decrease > 1:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.__last_decrease = now
+
+    def __get_backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(
+        self,
+        func: Callable[..., T],
+        *args: Any,
+        idempotent: bool = True,
+        **kwargs: Any,
+    ) -> T:
+        """
+        Calls func once the rate limit allows it, retrying retryable failures.
+
+        Args:
+            func (Callable[..., T]): The client function to call.
+            *args: Positional arguments for func.
+            idempotent (bool): Whether func can be repeated without effect.
+                Calls that are not, such as creating a playlist, are only
+                retried when throttled or when the request was never sent.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            T: The value returned by func.
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e, idempotent):
+                    with self.__lock:
+                        self.errors += 1
+                    raise
+
+                status = get_status_code(e)
+                retry_after = get_retry_after(e)
+                if status == 429:
+                    self.__on_throttled(retry_after)
+                    logger.warning(
+                        f"{self.name}: throttled, lowering rate to {self.rate:.2f} requests/s"
+                    )
+
+                if retry_after is None:
+                    delay = self.__get_backoff(attempt)
+                elif status == 429:
+                    # Already enforced for every caller by acquire()
+                    delay = 0
+                else:
+                    delay = retry_after
+                logger.debug(f"{self.name}: retrying in {delay:.2f}s after: {e}")
+
+                with self.__lock:
+                    self.retries += 1
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self.__on_success()
+            return result
@@ -0,0 +1,93 @@
+import importlib
+from importlib.metadata import entry_points
+from typing import List, Type
+
+from .music_service import MusicService
+
+# Packages can register more music services under this entry point group,
+# pointing at their MusicService implementation
+ENTRY_POINT_GROUP = "open_tune_transfer.services"
+
+
+class LazyService:
+    """
+    Describes a music service without importing it. It answers the same
+    has_auth(), pretty_name() and arg_name() questions as the MusicService
+    class, and load() imports the implementation, along with its SDK, only
+    once the service has been selected.
+    """
+
+    def __init__(
+        self, arg_name: str, pretty_name: str, has_auth: bool, target: str
+    ) -> None:
+        self.__arg_name = arg_name
+        self.__pretty_name = pretty_name
+        self.__has_auth = has_auth
+        # "module:ClassName" of the MusicService implementation
+        self.target = target
+
+    @classmethod
+    def from_class(cls, service: Type[MusicService], target: str) -> "LazyService":
+        return cls(
+            service.arg_name(), service.pretty_name(), service.has_auth(), target
+        )
+
+    def has_auth(self) -> bool:
+        return self.__has_auth
+
+    def pretty_name(self) -> str:
+        return self.__pretty_name
+
+    def arg_name(self) -> str:
+        return self.__arg_name
+
+    def load(self) -> Type[MusicService]:
+        module, _, name = self.target.partition(":")
+        return getattr(importlib.import_module(module), name)
+
+
+BUILTIN_SERVICES = [
+    LazyService(
+        "spotify", "Spotify", True, "music_services.spotify_service:SpotifyService"
+    ),
+    LazyService(
+        "ytmusic",
+        "Youtube Music",
+        True,
+        "music_services.ytmusic_service:YoutubeMusicService",
+    ),
+    LazyService(
+        "deezer", "Deezer", False, "music_services.deezer_service:DeezerService"
+    ),
+    LazyService(
+        "file", "Snapshot file", False, "music_services.file_service:FileService"
+    ),
+]
+
+
+def get_services() -> List[LazyService]:
+    """
+    Lists the built-in music services, followed by those registered by
+    installed packages.
+
+    Plugins are imported to learn their names, so they should keep their SDK
+    imports out of module level too.
+
+    Returns:
+        List[LazyService]: The available music services.
+    """
+    services = list(BUILTIN_SERVICES)
+    known = {service.arg_name() for service in services}
+
+    try:
+        plugins = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # Python < 3.10 returns every group at once
+        plugins = entry_points().get(ENTRY_POINT_GROUP, [])
+
+    for plugin in plugins:
+        if plugin.name in known:
+            continue
+        services.append(LazyService.from_class(plugin.load(), plugin.value))
+        known.add(plugin.name)
+    return services
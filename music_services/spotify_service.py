@@ -1,6 +1,11 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from spotipy import Spotify, SpotifyPKCE
 
-from .music_service import MusicService, Playlist, Song
+from .http_session import PooledSession
+from .music_service import MusicService, Playlist, ServiceCapabilities, Song
+from .normalization import build_query, clean_artist, clean_title
 
 
 class SpotifyService(MusicService):
@@ -8,9 +13,21 @@ class SpotifyService(MusicService):
         sp_oauth = SpotifyPKCE(
             client_id="96d2d77892cc4384aff4a7328e68b41f",
             redirect_uri="http://localhost:8888/callback",
-            scope="user-library-read",
+            scope=" ".join(
+                [
+                    "user-library-read",
+                    "user-library-modify",
+                    "playlist-read-private",
+                    "playlist-modify-private",
+                ]
+            ),
+        )
+        self.sp = Spotify(
+            auth=sp_oauth.get_access_token(check_cache=True),
+            requests_session=PooledSession.for_service(self.arg_name()),
         )
-        self.sp = Spotify(auth=sp_oauth.get_access_token(check_cache=True))
+        self.__current_user = None
+        self.__current_user_lock = threading.Lock()
 
     @classmethod
     def has_auth(cls):
@@ -24,47 +41,104 @@ class SpotifyService(MusicService):
     def arg_name(cls):
         return "spotify"
 
+    @classmethod
+    def capabilities(cls):
+        # playlist_add_items accepts at most 100 items per request and
+        # current_user_saved_tracks_add at most 50
+        return ServiceCapabilities(
+            supports_bulk_add=True,
+            max_batch_size=100,
+            supports_bulk_like=True,
+            max_like_batch_size=50,
+            supports_isrc_search=True,
+            requests_per_second=15.0,
+        )
+
     def __extract_playlist_info(self, playlist):
         return Playlist(
             id=playlist.get("id", ""),
             name=playlist.get("name", ""),
             description=playlist.get("description", ""),
+            track_count=(playlist.get("tracks") or {}).get("total"),
+            change_token=playlist.get("snapshot_id"),
         )
 
     def __extract_song_info(self, track):
-        artist = track.get("artists", [])[:1]
-        artist = artist["name"] if artist else ""
+        artists = track.get("artists") or []
+        artist = artists[0]["name"] if artists else ""
         return Song(
             id=track.get("uri", ""),
             name=track.get("name", ""),
             artist=artist,
+            isrc=(track.get("external_ids") or {}).get("isrc"),
+            duration=(
+                track["duration_ms"] // 1000 if track.get("duration_ms") else None
+            ),
         )
 
+    def __iter_pages(self, page):
+        # Fetch the next page in the background while the current one is consumed
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while page:
+                next_page = (
+                    executor.submit(self._call, self.sp.next, page)
+                    if page["next"]
+                    else None
+                )
+                yield from page["items"]
+                page = next_page.result() if next_page else None
+
+    def __get_current_user(self):
+        # The account does not change while the service is in use
+        with self.__current_user_lock:
+            if not self.__current_user:
+                self.__current_user = self._call(self.sp.current_user)
+            return self.__current_user
+
     def get_user_id(self):
-        curr = self.sp.current_user()
+        curr = self.__get_current_user()
         if curr:
             return curr["id"]
         raise Exception("Could not get user id")
 
     def create_playlist(self, name, description=""):
         user_id = self.get_user_id()
-        playlist = self.sp.user_playlist_create(
-            user_id, name, public=False, description=description
+        playlist = self._call(
+            self.sp.user_playlist_create,
+            user_id,
+            name,
+            public=False,
+            description=description,
+            idempotent=False,
         )
         if playlist:
             return playlist["id"]
         raise Exception("Could not create playlist")
 
     def add_songs_to_playlist(self, playlist_id, song_ids):
-        return self.sp.playlist_add_items(playlist_id, song_ids)
+        return self._call(
+            self.sp.playlist_add_items, playlist_id, song_ids, idempotent=False
+        )
 
     def add_song_to_playlist(self, playlist_id, song_id):
-        return self.sp.playlist_add_items(playlist_id, [song_id])
+        return self._call(
+            self.sp.playlist_add_items, playlist_id, [song_id], idempotent=False
+        )
+
+    def remove_songs_from_playlist(self, playlist_id, song_ids):
+        # Removals accept the same number of items per request as additions
+        batch_size = self.capabilities().max_batch_size
+        for start in range(0, len(song_ids), batch_size):
+            self._call(
+                self.sp.playlist_remove_all_occurrences_of_items,
+                playlist_id,
+                song_ids[start : start + batch_size],
+            )
 
     def get_all_playlists(self):
         data = []
         while True:
-            response = self.sp.current_user_playlists(offset=len(data))
+            response = self._call(self.sp.current_user_playlists, offset=len(data))
             if not response:
                 break
 
@@ -76,29 +150,69 @@ class SpotifyService(MusicService):
         return data
 
     def get_playlist_songs(self, playlist_id):
-        response = self.sp.playlist(playlist_id)
-        if response:
-            return [
-                self.__extract_song_info(item["track"])
-                for item in response["tracks"]["items"]
-            ]
+        return list(self.iter_playlist_songs(playlist_id))
+
+    def iter_playlist_songs(self, playlist_id):
+        response = self._call(
+            self.sp.playlist_items,
+            playlist_id,
+            fields="items(track(uri,name,artists(name),external_ids,duration_ms)),next",
+            additional_types=("track",),
+        )
+        for item in self.__iter_pages(response):
+            # Local files and unavailable tracks have no track object
+            if item.get("track"):
+                yield self.__extract_song_info(item["track"])
 
     def get_liked_songs(self):
-        response = self.sp.current_user_saved_tracks()
-        if response:
-            return [
-                self.__extract_song_info(item["track"]) for item in response["items"]
-            ]
-        raise Exception("Could not get liked songs")
+        return list(self.iter_liked_songs())
+
+    def iter_liked_songs(self):
+        response = self._call(self.sp.current_user_saved_tracks, limit=50)
+        if not response:
+            raise Exception("Could not get liked songs")
+
+        for item in self.__iter_pages(response):
+            yield self.__extract_song_info(item["track"])
 
     def add_song_to_liked_songs(self, song_id):
-        return self.sp.current_user_saved_tracks_add([song_id])
+        return self._call(self.sp.current_user_saved_tracks_add, [song_id])
 
     def add_songs_to_liked_songs(self, song_ids):
-        return self.sp.current_user_saved_tracks_add(song_ids)
+        return self._call(self.sp.current_user_saved_tracks_add, song_ids)
+
+    def search_song_by_isrc(self, isrc):
+        response = self._call(self.sp.search, f"isrc:{isrc}", limit=1, type="track")
+        if response and response["tracks"]["items"]:
+            return self.__extract_song_info(response["tracks"]["items"][0])
+
+    def __search(self, q, limit):
+        response = self._call(self.sp.search, q, limit=limit)
+        if not response:
+            return []
+        return [self.__extract_song_info(t) for t in response["tracks"]["items"]]
+
+    def __search_by_fields(self, query, artist, limit):
+        title = clean_title(query).replace('"', "")
+        artist = clean_artist(artist).replace('"', "")
+        return self.__search(f'track:"{title}" artist:"{artist}"', limit)
+
+    def __search_by_title(self, query, artist, limit):
+        return self.__search(clean_title(query), limit)
+
+    def search_songs(self, query, artist, limit):
+        return self.__search(build_query(query, artist), limit)
+
+    def search_strategies(self):
+        return {
+            "title_artist": self.search_songs,
+            "structured": self.__search_by_fields,
+        }
+
+    def fallback_strategies(self):
+        return {"title": self.__search_by_title}
 
     def search_song(self, query, artist):
-        response = self.sp.search(f"{query} {artist}", limit=1)
-        if response:
-            response = response["tracks"]["items"]
-            return self.__extract_song_info(response[0])
+        songs = self.search_songs(query, artist, 1)
+        if songs:
+            return songs[0]
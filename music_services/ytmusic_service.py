@@ -1,19 +1,45 @@
 import os
+import threading
+from typing import Optional
 
 import ytmusicapi
 from ytmusicapi import YTMusic
 
-from .music_service import MusicService, Playlist, Song
+from .concurrent_writer import ConcurrentWriter
+from .http_session import PooledSession
+from .music_service import MusicService, Playlist, ServiceCapabilities, Song
+from .normalization import build_query, clean_title
+
+
+def parse_count(count) -> Optional[int]:
+    """
+    Parses the number of songs of a playlist, which ytmusicapi returns as
+    text such as "1,234" and leaves out for some playlists.
+
+    Args:
+        count: The count given by ytmusicapi.
+
+    Returns:
+        Optional[int]: The number of songs, or None if it is not known.
+    """
+    try:
+        return int(str(count).replace(",", ""))
+    except ValueError:
+        return None
 
 
 class YoutubeMusicService(MusicService):
     def __init__(self):
         oauth_file = "ytmusic_oauth.json"
 
-        if os.path.exists(oauth_file):
-            self.yt = YTMusic(auth=oauth_file)
-        else:
-            self.yt = ytmusicapi.setup_oauth(filepath=oauth_file)
+        if not os.path.exists(oauth_file):
+            ytmusicapi.setup_oauth(filepath=oauth_file)
+        self.yt = YTMusic(
+            auth=oauth_file,
+            requests_session=PooledSession.for_service(self.arg_name()),
+        )
+        self.__account_info = None
+        self.__account_info_lock = threading.Lock()
 
     @classmethod
     def has_auth(cls) -> bool:
@@ -27,55 +53,102 @@ class YoutubeMusicService(MusicService):
     def arg_name(cls) -> str:
         return "ytmusic"
 
+    @classmethod
+    def capabilities(cls) -> ServiceCapabilities:
+        return ServiceCapabilities(
+            supports_bulk_add=True, max_batch_size=100, requests_per_second=5.0
+        )
+
     def __extract_playlist_info(self, playlist):
         return Playlist(
             id=playlist.get("playlistId", ""),
             name=playlist.get("title", ""),
             description=playlist.get("description", ""),
+            track_count=parse_count(playlist.get("count")),
         )
 
     def __extract_song_info(self, track):
-        artist = track.get(["artists"], [])[:1]
-        artist = artist["name"] if artist else ""
+        artists = track.get("artists") or []
+        artist = artists[0]["name"] if artists else ""
         return Song(
             id=track.get("videoId", ""),
             name=track.get("title", ""),
             artist=artist,
+            duration=track.get("duration_seconds"),
         )
 
+    def __get_account_info(self):
+        # The account does not change while the service is in use
+        with self.__account_info_lock:
+            if not self.__account_info:
+                self.__account_info = self._call(self.yt.get_account_info)
+            return self.__account_info
+
     def get_user_id(self):
-        return (self.yt.get_account_info()).get("channelHandle")
+        return self.__get_account_info().get("channelHandle")
 
     def create_playlist(self, name, description=""):
-        return self.yt.create_playlist(name, description)
+        return self._call(self.yt.create_playlist, name, description, idempotent=False)
 
     def add_songs_to_playlist(self, playlist_id, song_ids):
-        return self.yt.add_playlist_items(playlist_id, song_ids)
+        return self._call(
+            self.yt.add_playlist_items, playlist_id, song_ids, idempotent=False
+        )
 
     def add_song_to_playlist(self, playlist_id, song_id):
-        return self.yt.add_playlist_items(playlist_id, [song_id])
+        return self._call(
+            self.yt.add_playlist_items, playlist_id, [song_id], idempotent=False
+        )
 
     def get_playlist_songs(self, playlist_id):
-        response = self.yt.get_playlist(playlist_id)
-        return [self.__extract_song_info(item) for item in response]
+        response = self._call(self.yt.get_playlist, playlist_id, limit=None)
+        return [self.__extract_song_info(item) for item in response["tracks"]]
+
+    def remove_songs_from_playlist(self, playlist_id, song_ids):
+        # Removing needs the setVideoId of each playlist entry, not only the videoId
+        song_ids = set(song_ids)
+        response = self._call(self.yt.get_playlist, playlist_id, limit=None)
+        entries = [t for t in response["tracks"] if t.get("videoId") in song_ids]
+        if entries:
+            return self._call(self.yt.remove_playlist_items, playlist_id, entries)
 
     def get_liked_songs(self):
-        response = self.yt.get_library_songs(limit=0)
-        return [self.__extract_song_info(item) for item in response["tracks"]]
+        response = self._call(self.yt.get_library_songs, limit=None)
+        return [self.__extract_song_info(item) for item in response]
 
     def get_all_playlists(self):
-        response = self.yt.get_library_playlists(limit=0)
+        response = self._call(self.yt.get_library_playlists, limit=None)
         response = [i for i in response if i["playlistId"] not in ["LM", "RDPN", "SE"]]
         return [self.__extract_playlist_info(playlist) for playlist in response]
 
     def add_songs_to_liked_songs(self, song_ids):
-        for song_id in song_ids:
-            self.yt.rate_song(song_id, "LIKE")
+        # There is no endpoint for liking several songs at once
+        writer = ConcurrentWriter(
+            self.add_song_to_liked_songs, self.capabilities().write_concurrency
+        )
+        writer.write(song_ids)
 
     def add_song_to_liked_songs(self, song_id):
-        return self.yt.rate_song(song_id, "LIKE")
+        return self._call(self.yt.rate_song, song_id, "LIKE")
+
+    def __search(self, q, limit):
+        # The limit is only a lower bound, so extra results are dropped
+        response = self._call(self.yt.search, q, filter="songs", limit=limit)
+        return [self.__extract_song_info(track) for track in response[:limit]]
+
+    def __search_by_title(self, query, artist, limit):
+        return self.__search(clean_title(query), limit)
+
+    def search_songs(self, query, artist, limit):
+        return self.__search(build_query(query, artist), limit)
+
+    def search_strategies(self):
+        return {"title_artist": self.search_songs}
+
+    def fallback_strategies(self):
+        return {"title": self.__search_by_title}
 
     def search_song(self, query, artist):
-        response = self.yt.search(f"{query} {artist}", filter="songs", limit=1)
-        if response:
-            return self.__extract_song_info(response[0])
+        songs = self.search_songs(query, artist, 1)
+        if songs:
+            return songs[0]
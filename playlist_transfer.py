@@ -1,10 +1,185 @@
 import logging
-from typing import List, Optional
-
-from thefuzz import fuzz
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from itertools import islice
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
+from event_log import song_event
+from library_index import LibraryIndex
+from match_cache import MatchCache
+from music_services.concurrent_writer import ConcurrentWriter, PartialWriteError
 from music_services.music_service import MusicService, Playlist, Song
-from music_services.spotify_service import SpotifyService
+from music_services.normalization import normalize_song_key
+from song_matcher import SongMatcher
+from transfer_journal import TransferJournal
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Songs written per batch when single-song writes are emulated concurrently
+CONCURRENT_BATCH_SIZE = 50
+
+
+def ordered_map(
+    executor: Executor, func: Callable[[T], R], items: Iterable[T], window: int
+) -> Iterator[R]:
+    """
+    Maps func over items in an executor, yielding results in input order.
+
+    Unlike Executor.map, items are consumed lazily and at most `window` calls
+    are in flight at any time.
+    """
+    pending: Deque[Future] = deque()
+    try:
+        for item in items:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, item))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class ChunkedWriter:
+    """
+    Buffers song IDs as matches arrive and writes them in batches of at most
+    `batch_size` IDs.
+
+    Songs that a batch reported as failed with PartialWriteError are logged
+    and kept in `failed`, along with the origin songs they were added for in
+    `failed_songs`, and the transfer goes on with the next batch.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[str]], None],
+        batch_size: int,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.write = write
+        self.batch_size = batch_size
+        self.logger = logger
+        self.batches_written = 0
+        self.failed: Dict[str, Exception] = {}
+        self.failed_songs: List[Song] = []
+        self.__buffer: List[str] = []
+        # Origin songs of the buffered IDs, to report the ones that failed
+        self.__songs: Dict[str, Song] = {}
+
+    def add(self, song_id: str, song: Optional[Song] = None) -> None:
+        self.__buffer.append(song_id)
+        if song:
+            self.__songs[song_id] = song
+        if len(self.__buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.__buffer:
+            batch, self.__buffer = self.__buffer, []
+            songs, self.__songs = self.__songs, {}
+            try:
+                self.write(batch)
+            except PartialWriteError as e:
+                self.failed.update(e.failed)
+                self.failed_songs.extend(
+                    songs[song_id] for song_id in e.failed if song_id in songs
+                )
+                if self.logger:
+                    for song_id, error in e.failed.items():
+                        self.logger.error(f"Could not add song {song_id}: {error}")
+            self.batches_written += 1
+
+    @classmethod
+    def for_playlist(
+        cls,
+        destination: MusicService,
+        playlist_id: str,
+        logger: logging.Logger,
+        dry_run: bool = False,
+    ) -> "ChunkedWriter":
+        capabilities = destination.capabilities()
+        return cls.__create(
+            destination,
+            lambda song_ids: destination.add_songs_to_playlist(playlist_id, song_ids),
+            lambda song_id: destination.add_song_to_playlist(playlist_id, song_id),
+            capabilities.supports_bulk_add,
+            capabilities.max_batch_size,
+            logger,
+            dry_run,
+        )
+
+    @classmethod
+    def for_liked_songs(
+        cls, destination: MusicService, logger: logging.Logger, dry_run: bool = False
+    ) -> "ChunkedWriter":
+        capabilities = destination.capabilities()
+        return cls.__create(
+            destination,
+            destination.add_songs_to_liked_songs,
+            destination.add_song_to_liked_songs,
+            capabilities.supports_bulk_like,
+            capabilities.max_like_batch_size,
+            logger,
+            dry_run,
+            # Liked songs have no position, so they can be liked concurrently
+            concurrency=capabilities.write_concurrency,
+        )
+
+    @classmethod
+    def __create(
+        cls,
+        destination: MusicService,
+        add_songs: Callable[[List[str]], None],
+        add_song: Callable[[str], None],
+        supports_bulk: bool,
+        batch_size: int,
+        logger: logging.Logger,
+        dry_run: bool,
+        concurrency: int = 1,
+    ) -> "ChunkedWriter":
+        if dry_run:
+            return cls(lambda song_ids: None, batch_size=1)
+
+        # Not all services have endpoints for adding several songs at once
+        if supports_bulk:
+            logger.debug(
+                f"{destination.pretty_name()} supports bulk adds,"
+                + f" adding songs in batches of {batch_size}"
+            )
+            return cls(add_songs, batch_size, logger)
+
+        if concurrency > 1:
+            logger.debug(
+                f"{destination.pretty_name()} does not support bulk adds,"
+                + f" adding up to {concurrency} songs at once"
+            )
+            writer = ConcurrentWriter(add_song, concurrency)
+            return cls(writer.write, CONCURRENT_BATCH_SIZE, logger)
+
+        logger.debug(
+            f"{destination.pretty_name()} does not support bulk adds,"
+            + " adding songs one by one"
+        )
+        return cls(lambda song_ids: add_song(song_ids[0]), batch_size=1, logger=logger)
 
 
 class PlaylistTransferer:
@@ -14,11 +189,36 @@ class PlaylistTransferer:
         destination: MusicService,
         logger: Optional[logging.Logger] = None,
         dry_run: bool = False,
+        workers: int = 1,
+        cache: Optional[MatchCache] = None,
+        journal: Optional[TransferJournal] = None,
+        sync: bool = False,
+        remove_extras: bool = False,
+        index: Optional[LibraryIndex] = None,
+        skip_unchanged: bool = False,
     ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
         self.origin = origin
         self.destination = destination
         self.logger = logger or PlaylistTransferer.__get_null_logger()
         self.dry_run = dry_run
+        self.workers = workers
+        self.cache = cache
+        self.journal = journal
+        self.sync = sync
+        self.remove_extras = remove_extras
+        self.skip_unchanged = skip_unchanged
+        self.matcher = SongMatcher(
+            destination, self.logger, cache, journal, index=index
+        )
+        # Shared by every transfer, so that playlists transferred at the same
+        # time never run more than `workers` searches in total
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.__destination_playlists: Optional[Dict[str, str]] = None
+        self.__destination_playlists_lock = threading.Lock()
 
     @staticmethod
     def __get_null_logger() -> logging.Logger:
@@ -26,94 +226,325 @@ class PlaylistTransferer:
         logger.addHandler(logging.NullHandler())
         return logger
 
-    @staticmethod
-    def __check_match(str1: str, str2: str) -> bool:
-        return fuzz.ratio(str1, str2) > 70
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def __enter__(self) -> "PlaylistTransferer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __match_songs(
+        self, context: str, songs: Iterable[Song]
+    ) -> Iterator[Tuple[Song, Optional[Song]]]:
+        """
+        Searches the destination for every song, yielding (song, match) pairs
+        in their original order. Up to `self.workers` searches run concurrently.
+        """
+        yield from ordered_map(
+            self.executor,
+            lambda song: (song, self.matcher.match(song, context)),
+            songs,
+            window=self.workers * 2,
+        )
 
-    def __transfer_playlist_all_at_once(
-        self, playlist_id: str, songs: List[Song]
+    def __transfer_songs(
+        self,
+        context: str,
+        playlist_id: Optional[str],
+        songs: Iterable[Song],
+        writer: ChunkedWriter,
+        existing_ids: AbstractSet[str] = frozenset(),
+        matched_ids: Optional[Set[str]] = None,
+        change_token: Optional[str] = None,
     ) -> List[Song]:
+        """
+        Matches and writes songs to the destination, returning the ones not
+        added: the songs not found, then the ones whose write failed.
+
+        Matches whose ID is in `existing_ids` are not written again. The IDs of
+        all matches are added to `matched_ids`, if given.
+
+        Progress is no longer recorded once a write failed, and the transfer
+        is not recorded as done, so that resuming it retries the failed songs.
+        `change_token` is only recorded once every song has been written, so
+        that the next sync does not skip a playlist with failed songs.
+        """
         not_match = []
-        found_song_ids = []
+        songs = iter(songs)
 
-        for song in songs:
-            self.logger.info(
-                f"Playlist {playlist_id}: searching for a match to {song.name}"
-                + f" - {song.artist}"
-                if song.artist
-                else ""
-            )
+        # Songs before the committed position were written by a previous run.
+        # Syncing diffs against the destination instead, so it has no positions.
+        resumable = self.journal is not None and not self.sync
+        position = self.journal.get_position(playlist_id) if resumable else 0
+        if position:
+            self.logger.info(f"{context}: resuming after {position} songs")
+        for song in islice(songs, position):
+            _, match = self.journal.get_match(song.id)
+            if match is None:
+                not_match.append(song)
 
-            match = self.destination.search_song(song.name, song.artist)
-            if match and PlaylistTransferer.__check_match(song.name, match.name):
+        batches_written = writer.batches_written
+        for position, (song, match) in enumerate(
+            self.__match_songs(context, songs), start=position + 1
+        ):
+            if match and match.id in existing_ids:
+                self.logger.info(
+                    '%s: "%s" is already there',
+                    context,
+                    match.name,
+                    extra=song_event("song_present", context, song, match),
+                )
+            elif match:
                 self.logger.info(
-                    f"Playlist {playlist_id}: found match: {match.name}. Song will be added to the playlist at the end"
+                    '%s: found match: "%s"',
+                    context,
+                    match.name,
+                    extra=song_event("song_match", context, song, match),
                 )
-                found_song_ids += match.id
+                writer.add(match.id, song)
             else:
-                self.logger.info(f'Playlist {playlist_id}: No match for "{song.name}"')
+                self.logger.warning(
+                    '%s: No match for "%s"',
+                    context,
+                    song.name,
+                    extra=song_event("song_not_found", context, song),
+                )
                 not_match.append(song)
 
-        self.logger.info(f"Adding found songs to playlist {playlist_id}")
-        if not self.dry_run:
-            self.destination.add_songs_to_playlist(playlist_id, found_song_ids)
+            if match and matched_ids is not None:
+                matched_ids.add(match.id)
 
-        return not_match
+            if resumable and writer.batches_written != batches_written:
+                batches_written = writer.batches_written
+                if not writer.failed:
+                    self.journal.record_position(playlist_id, position)
 
-    def __transfer_playlist_one_by_one(
-        self,
-        playlist_id: str,
-        songs: List[Song],
-    ) -> List[Song]:
-        not_match = []
+        writer.flush()
+        if writer.failed:
+            self.logger.warning(
+                f"{context}: {len(writer.failed)} songs could not be added"
+            )
+        elif self.journal:
+            self.journal.record_done(playlist_id, not_match, change_token)
+        return not_match + writer.failed_songs
+
+    def __log_read_songs(self, songs: Iterable[Song]) -> Iterable[Song]:
+        # The list is only built when it is going to be logged
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return songs
+        return self.__log_songs_read(songs)
+
+    def __log_songs_read(self, songs: Iterable[Song]) -> Iterator[Song]:
+        # Songs are streamed from the origin, so they are only known once read
+        song_names = []
+        for song in songs:
+            song_names.append(song.name)
+            yield song
+
+        formatted_song_list = "\n".join(
+            [f"{idx} - {name}" for idx, name in enumerate(song_names, start=1)]
+        )
+        self.logger.debug("Songs transferred:\n%s", formatted_song_list)
+
+    def __get_destination_playlist(self, playlist: Playlist) -> str:
+        if self.dry_run:
+            return "DRY-RUN"
+
+        if self.journal:
+            to_playlist = self.journal.get_destination_playlist(playlist.id)
+            if to_playlist:
+                self.logger.debug(
+                    f'Reusing playlist "{playlist.name}" with ID {to_playlist}'
+                )
+                return to_playlist
+
+        to_playlist = self.destination.create_playlist(
+            playlist.name, playlist.description
+        )
+        if self.journal:
+            self.journal.record_destination_playlist(playlist.id, to_playlist)
+
+        self.logger.debug(f'Created playlist "{playlist.name}" with ID {to_playlist}')
+        return to_playlist
+
+    def __find_destination_playlist(self, playlist: Playlist) -> Optional[str]:
+        if self.journal:
+            to_playlist = self.journal.get_mapped_playlist(playlist.id)
+            if to_playlist:
+                return to_playlist
+
+        # Fall back to a playlist with the same name, listing them only once
+        with self.__destination_playlists_lock:
+            if self.__destination_playlists is None:
+                self.__destination_playlists = {}
+                for p in self.destination.get_all_playlists():
+                    self.__destination_playlists.setdefault(p.name, p.id)
 
+        to_playlist = self.__destination_playlists.get(playlist.name)
+        if to_playlist and self.journal and not self.dry_run:
+            self.journal.record_destination_playlist(playlist.id, to_playlist)
+        return to_playlist
+
+    def __missing_songs(
+        self,
+        songs: Iterable[Song],
+        existing: List[Song],
+        origin_keys: Set[Tuple[str, str]],
+    ) -> Iterator[Song]:
+        """
+        Yields the songs that are not in `existing`, comparing normalized titles
+        and artists, and adds the key of every song read to `origin_keys`.
+        """
+        existing_keys = {normalize_song_key(s.name, s.artist) for s in existing}
         for song in songs:
+            key = normalize_song_key(song.name, song.artist)
+            origin_keys.add(key)
+            if key not in existing_keys:
+                yield song
+
+    def __get_origin_songs(
+        self, playlist: Playlist, songs: Optional[Iterable[Song]]
+    ) -> Iterable[Song]:
+        if songs is None:
+            songs = self.origin.iter_playlist_songs(playlist.id)
+        if songs is None:
+            raise ValueError(f"Could not retrieve songs from playlist {playlist.name}")
+        return songs
+
+    def __sync_playlist(
+        self, playlist: Playlist, songs: Optional[Iterable[Song]]
+    ) -> List[Song]:
+        to_playlist = self.__find_destination_playlist(playlist)
+        if to_playlist is None:
             self.logger.info(
-                f"Playlist {playlist_id}: searching for a match to: {song.name}"
+                f"{playlist.name} is not in {self.destination.pretty_name()} yet,"
+                + " importing all of it"
             )
+            return self.__import_playlist(playlist, songs)
 
-            match = self.destination.search_song(song.name, song.artist)
+        songs = self.__get_origin_songs(playlist, songs)
+        existing = self.destination.get_playlist_songs(to_playlist) or []
+        self.logger.info(
+            f"Syncing {playlist.name} into playlist {to_playlist},"
+            + f" which has {len(existing)} songs"
+        )
 
-            if match and PlaylistTransferer.__check_match(song.name, match.name):
+        origin_keys: Set[Tuple[str, str]] = set()
+        matched_ids: Set[str] = set()
+        writer = ChunkedWriter.for_playlist(
+            self.destination, to_playlist, self.logger, self.dry_run
+        )
+        not_match = self.__transfer_songs(
+            f"Playlist {to_playlist}",
+            playlist.id,
+            self.__missing_songs(self.__log_read_songs(songs), existing, origin_keys),
+            writer,
+            existing_ids={s.id for s in existing},
+            matched_ids=matched_ids,
+            change_token=playlist.change_token,
+        )
+
+        if self.remove_extras:
+            extras = [
+                s.id
+                for s in existing
+                if normalize_song_key(s.name, s.artist) not in origin_keys
+                and s.id not in matched_ids
+            ]
+            if extras:
                 self.logger.info(
-                    f'Playlist {playlist_id}: Adding "{match.name}" to the playlist '
+                    f"Playlist {to_playlist}: removing {len(extras)} songs"
+                    + f" that are not in {playlist.name}"
                 )
                 if not self.dry_run:
-                    self.destination.add_song_to_playlist(playlist_id, match.id)
-            else:
-                self.logger.warn(f'Playlist {playlist_id}: No match for "{song.name}"')
-                not_match.append(song)
+                    self.destination.remove_songs_from_playlist(to_playlist, extras)
 
         return not_match
 
-    def transfer_playlist(self, playlist: Playlist) -> List[Song]:
-        songs = self.origin.get_playlist_songs(playlist.id)
-        if songs is None:
-            raise ValueError(f"Could not retrieve songs from playlist {playlist.name}")
-
-        song_names = [song.name for song in songs]
-        formatted_song_list = "\n".join(
-            [f"{idx} - {name}" for idx, name in enumerate(song_names, start=1)]
+    def __import_playlist(
+        self, playlist: Playlist, songs: Optional[Iterable[Song]]
+    ) -> List[Song]:
+        songs = self.__get_origin_songs(playlist, songs)
+        to_playlist = self.__get_destination_playlist(playlist)
+        writer = ChunkedWriter.for_playlist(
+            self.destination, to_playlist, self.logger, self.dry_run
+        )
+        return self.__transfer_songs(
+            f"Playlist {to_playlist}",
+            playlist.id,
+            self.__log_read_songs(songs),
+            writer,
+            change_token=playlist.change_token,
         )
-        self.logger.debug(f"Songs to transfer:\n{formatted_song_list}")
 
-        to_playlist = (
-            "DRY-RUN"
-            if self.dry_run
-            else self.destination.create_playlist(playlist.name, playlist.description)
+    def is_unchanged(self, playlist: Playlist) -> bool:
+        """
+        Checks whether syncing a playlist can be skipped because its change
+        token is the same as when it was last synced, which needs no call to
+        the origin.
+
+        Args:
+            playlist (Playlist): The origin playlist, as listed.
+
+        Returns:
+            bool: True if the playlist did not change since it was last synced.
+        """
+        if not (self.sync and self.skip_unchanged and self.journal):
+            return False
+        return (
+            playlist.change_token is not None
+            and playlist.change_token == self.journal.get_change_token(playlist.id)
+            and self.journal.get_mapped_playlist(playlist.id) is not None
         )
 
-        self.logger.debug(f'Created playlist "{playlist.name}" with ID {to_playlist}')
+    def transfer_playlist(
+        self, playlist: Playlist, songs: Optional[Iterable[Song]] = None
+    ) -> List[Song]:
+        """
+        Transfers a playlist, returning the songs not found in the destination.
+
+        Args:
+            playlist (Playlist): The origin playlist.
+            songs (Optional[Iterable[Song]]): The songs of the playlist, if they
+                were already fetched. They are fetched from the origin otherwise.
 
-        # Not all services have endpoints for adding all songs at once
-        at_once = self.origin.__class__ in [SpotifyService]
-        if at_once:
-            self.logger.debug(
-                f"Target is {type(self.destination).__name__}, calling add_to_playlist_all_at_once"
+        Returns:
+            List[Song]: The songs that were not found or could not be added.
+        """
+        if self.journal and self.journal.is_done(playlist.id):
+            self.logger.info(f"Skipping {playlist.name}, it was already imported")
+            return self.journal.get_not_match(playlist.id)
+
+        if self.is_unchanged(playlist):
+            self.logger.info(
+                f"Skipping {playlist.name}, it did not change since it was last synced"
             )
-            return self.__transfer_playlist_all_at_once(to_playlist, songs)
+            return []
+
+        if self.sync:
+            return self.__sync_playlist(playlist, songs)
+        return self.__import_playlist(playlist, songs)
 
-        self.logger.debug(
-            f"Target is {type(self.destination).__name__}, calling add_to_playlist_one_by_one"
+    def transfer_liked_songs(self) -> List[Song]:
+        if self.journal and self.journal.is_done(None):
+            self.logger.info("Skipping liked songs, they were already imported")
+            return self.journal.get_not_match(None)
+
+        songs = self.__log_read_songs(self.origin.iter_liked_songs())
+        existing: List[Song] = []
+        if self.sync:
+            existing = self.destination.get_liked_songs()
+            songs = self.__missing_songs(songs, existing, set())
+
+        writer = ChunkedWriter.for_liked_songs(
+            self.destination, self.logger, self.dry_run
+        )
+        return self.__transfer_songs(
+            "Liked songs",
+            None,
+            songs,
+            writer,
+            existing_ids={s.id for s in existing},
         )
-        return self.__transfer_playlist_one_by_one(to_playlist, songs)
@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Hashable, List, Optional
+
+from rapidfuzz import fuzz, process
+
+from event_log import song_event
+from library_index import LibraryIndex
+from match_cache import MatchCache
+from music_services.music_service import MusicService, Song
+from music_services.normalization import (
+    clean_artist,
+    clean_title,
+    normalize_song_key,
+    normalize_text,
+)
+from music_services.query_planner import QueryPlanner
+from transfer_journal import TransferJournal
+
+# How much each field counts towards a candidate's score
+TITLE_WEIGHT = 0.6
+ARTIST_WEIGHT = 0.3
+DURATION_WEIGHT = 0.1
+# Songs whose lengths differ by more than this many seconds never match
+MAX_DURATION_DIFFERENCE = 30
+MIN_TITLE_SCORE = 70
+MIN_ARTIST_SCORE = 70
+# A title match alone scores 66.7 when the artist is known, so it cannot pass
+MIN_SCORE = 75
+# Library candidates are not filtered by a search engine first, so matching
+# them needs a closer resemblance
+MIN_LIBRARY_SCORE = 90
+
+
+def _get_scores(query: str, choices: List[str], scorer) -> List[float]:
+    # process.extract scores every choice in a single native call
+    scores = [0.0] * len(choices)
+    for _, score, index in process.extract(query, choices, scorer=scorer, limit=None):
+        scores[index] = score
+    return scores
+
+
+def score_candidates(song: Song, candidates: List[Song]) -> List[float]:
+    """
+    Scores how well each candidate matches a song, combining title, artist and
+    duration similarity. Fields missing from the song are left out.
+
+    Args:
+        song (Song): The origin song.
+        candidates (List[Song]): The destination songs found by a search.
+
+    Returns:
+        List[float]: The score of each candidate, from 0 to 100. Candidates
+            whose title or artist is too different, or whose length differs by
+            more than MAX_DURATION_DIFFERENCE seconds, score 0.
+    """
+    titles = _get_scores(
+        normalize_text(clean_title(song.name)),
+        [normalize_text(clean_title(c.name)) for c in candidates],
+        fuzz.ratio,
+    )
+    artists = (
+        _get_scores(
+            normalize_text(clean_artist(song.artist)),
+            [normalize_text(clean_artist(c.artist)) for c in candidates],
+            # Word order differs between services, but extra words such as
+            # "Tribute Band" make a different artist
+            fuzz.token_sort_ratio,
+        )
+        if song.artist
+        else None
+    )
+
+    scores = []
+    for i, candidate in enumerate(candidates):
+        known_artists = artists is not None and candidate.artist
+        difference = (
+            abs(song.duration - candidate.duration)
+            if song.duration and candidate.duration
+            else None
+        )
+        if (
+            titles[i] <= MIN_TITLE_SCORE
+            or (known_artists and artists[i] < MIN_ARTIST_SCORE)
+            or (difference is not None and difference > MAX_DURATION_DIFFERENCE)
+        ):
+            scores.append(0.0)
+            continue
+
+        total, weights = TITLE_WEIGHT * titles[i], TITLE_WEIGHT
+        if known_artists:
+            total += ARTIST_WEIGHT * artists[i]
+            weights += ARTIST_WEIGHT
+        if difference is not None:
+            total += DURATION_WEIGHT * 100 * (1 - difference / MAX_DURATION_DIFFERENCE)
+            weights += DURATION_WEIGHT
+        scores.append(total / weights)
+    return scores
+
+
+class SongMatcher:
+    """
+    Finds the destination song matching an origin song. Shared by the
+    synchronous and asynchronous transfer engines, and safe to call from
+    several threads at once.
+
+    Every resolution is kept for the whole run, keyed by origin song ID and by
+    normalized title and artist, so a song that appears in several playlists
+    is only searched once. Concurrent lookups of the same song wait for the
+    search already in flight instead of starting another one.
+
+    With an index of the destination user's library, songs the user already
+    has are matched locally, before the cache and the remote search. Remote
+    searches try the destination's search strategies in the order chosen by
+    its query planner, until one of them finds a match.
+    """
+
+    def __init__(
+        self,
+        destination: MusicService,
+        logger: logging.Logger,
+        cache: Optional[MatchCache] = None,
+        journal: Optional[TransferJournal] = None,
+        candidates: int = 5,
+        index: Optional[LibraryIndex] = None,
+    ) -> None:
+        self.destination = destination
+        self.logger = logger
+        self.cache = cache
+        self.journal = journal
+        self.candidates = candidates
+        self.index = index
+        self.deduplicated = 0
+        self.found_in_library = 0
+
+        self.__resolutions: Dict[Hashable, Future] = {}
+        self.__resolutions_lock = threading.Lock()
+        self.__stats_lock = threading.Lock()
+
+    def match(self, song: Song, context: str) -> Optional[Song]:
+        """
+        Searches the destination for a song.
+
+        Args:
+            song (Song): The origin song.
+            context (str): Prefix for log messages, e.g. the playlist ID.
+
+        Returns:
+            Optional[Song]: The matching destination song, if any.
+        """
+        self.logger.info(
+            "%s: searching for a match to %s%s",
+            context,
+            song.name,
+            f" - {song.artist}" if song.artist else "",
+            extra=song_event("song_search", context, song),
+        )
+
+        if self.journal:
+            recorded, match = self.journal.get_match(song.id)
+            if recorded:
+                return match
+
+        match = self.__resolve_once(song)
+        if self.journal:
+            self.journal.record_match(song.id, match)
+        return match
+
+    @staticmethod
+    def __get_keys(song: Song) -> List[Hashable]:
+        keys: List[Hashable] = [("song", *normalize_song_key(song.name, song.artist))]
+        if song.id:
+            keys.insert(0, ("id", str(song.id)))
+        return keys
+
+    def __resolve_once(self, song: Song) -> Optional[Song]:
+        keys = SongMatcher.__get_keys(song)
+        with self.__resolutions_lock:
+            future = next(
+                (self.__resolutions[k] for k in keys if k in self.__resolutions),
+                None,
+            )
+            owner = future is None
+            if owner:
+                future = Future()
+            else:
+                self.deduplicated += 1
+            for key in keys:
+                self.__resolutions.setdefault(key, future)
+
+        if not owner:
+            return future.result()
+
+        try:
+            match = self.__resolve(song)
+        except Exception as e:
+            # Let later lookups of the song try again
+            with self.__resolutions_lock:
+                for key in keys:
+                    if self.__resolutions.get(key) is future:
+                        del self.__resolutions[key]
+            future.set_exception(e)
+            raise
+
+        future.set_result(match)
+        return match
+
+    @staticmethod
+    def __pick(
+        song: Song, candidates: List[Song], min_score: float = MIN_SCORE
+    ) -> Optional[Song]:
+        if not candidates:
+            return None
+
+        scores = score_candidates(song, candidates)
+        best = max(range(len(candidates)), key=scores.__getitem__)
+        return candidates[best] if scores[best] >= min_score else None
+
+    def __find_in_library(self, song: Song) -> Optional[Song]:
+        match = self.index.find_exact(song) or SongMatcher.__pick(
+            song, self.index.candidates(song, self.candidates), MIN_LIBRARY_SCORE
+        )
+        if match:
+            with self.__stats_lock:
+                self.found_in_library += 1
+        return match
+
+    def __search(self, song: Song) -> Optional[Song]:
+        # An ISRC identifies the exact recording, so a match needs neither a
+        # text search nor fuzzy scoring
+        if song.isrc and self.destination.capabilities().supports_isrc_search:
+            match = self.destination.search_song_by_isrc(song.isrc)
+            if match:
+                return match
+
+        strategies = self.destination.search_strategies()
+        fallbacks = self.destination.fallback_strategies()
+        planner = QueryPlanner.for_service(self.destination.arg_name())
+        for name in planner.plan(list(strategies), list(fallbacks)):
+            search = strategies.get(name) or fallbacks[name]
+            start = time.perf_counter()
+            candidates = search(song.name, song.artist, self.candidates)
+            match = SongMatcher.__pick(song, candidates)
+            planner.record(name, match is not None, time.perf_counter() - start)
+            if match:
+                return match
+        return None
+
+    def __resolve(self, song: Song) -> Optional[Song]:
+        if self.index:
+            match = self.__find_in_library(song)
+            if match:
+                return match
+
+        service = self.destination.arg_name()
+        if self.cache:
+            cached, match = self.cache.get(service, song.name, song.artist)
+            if cached:
+                return match
+
+        match = self.__search(song)
+
+        if self.cache:
+            self.cache.put(service, song.name, song.artist, match)
+        return match
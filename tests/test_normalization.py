@@ -0,0 +1,30 @@
+from music_services.normalization import clean_artist, clean_title, normalize_text
+
+
+def test_edition_tags_are_removed():
+    assert clean_title("Yesterday - Remastered 2009") == "Yesterday"
+    assert clean_title("Hey Jude (Remastered 2015)") == "Hey Jude"
+    assert clean_title("Song (2011 Remaster)") == "Song"
+    assert clean_title("Song [Mono / Remastered]") == "Song"
+    assert clean_title("Song (Deluxe Edition)") == "Song"
+    assert clean_title("Song - Single Version") == "Song"
+
+
+def test_other_versions_are_kept():
+    assert clean_title("Song (Live / Remastered 2011)") == (
+        "Song (Live / Remastered 2011)"
+    )
+    assert clean_title("Song (Clean Bandit Remix)") == "Song (Clean Bandit Remix)"
+    assert clean_title("Song [Live]") == "Song [Live]"
+    assert clean_title("Song (Acoustic Version)") == "Song (Acoustic Version)"
+
+
+def test_featured_artists_are_removed():
+    assert clean_title("Song (feat. Drake)") == "Song"
+    assert clean_title("Song ft. Someone") == "Song"
+    assert clean_title("Stay With Me") == "Stay With Me"
+    assert clean_artist("Artist feat. Other") == "Artist"
+
+
+def test_text_is_folded():
+    assert normalize_text("Beyoncé – Don't  Stop!") == "beyonce dont stop"
@@ -0,0 +1,85 @@
+from dataclasses import replace
+
+from benchmarks.fake_services import FakeMusicService, SyntheticLibrary
+from music_services.concurrent_writer import PartialWriteError
+from music_services.music_service import Song
+from playlist_transfer import PlaylistTransferer
+from transfer_journal import TransferJournal
+
+LIKED = [Song(f"o{i}", f"Song {i}", "Artist") for i in range(10)]
+CATALOG = [Song(f"d{i}", f"Song {i}", "Artist") for i in range(10)]
+
+
+class Origin(FakeMusicService.named("origin")):
+    def get_liked_songs(self):
+        return list(LIKED)
+
+
+class FlakyDestination(FakeMusicService.named("flaky_destination")):
+    # Songs are liked one per request, so a failed song does not fail others
+    CAPABILITIES = replace(FakeMusicService.CAPABILITIES, supports_bulk_like=False)
+
+    def __init__(self, failing):
+        super().__init__(SyntheticLibrary(catalog=CATALOG))
+        self.failing = failing
+
+    def add_song_to_liked_songs(self, song_id):
+        if song_id in self.failing:
+            raise ValueError("Could not like song")
+        return super().add_song_to_liked_songs(song_id)
+
+
+def transfer_liked_songs(path, failing, resume=False):
+    journal = TransferJournal(path, "origin", "flaky_destination", resume=resume)
+    destination = FlakyDestination(failing)
+    with PlaylistTransferer(Origin(), destination, journal=journal) as transferer:
+        not_added = transferer.transfer_liked_songs()
+    journal.close()
+    return not_added, journal, destination
+
+
+def test_failed_writes_are_reported_and_retried(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    not_added, journal, _ = transfer_liked_songs(path, failing={"d3", "d7"})
+    assert sorted(song.id for song in not_added) == ["o3", "o7"]
+    assert not journal.is_done(None)
+
+    not_added, journal, destination = transfer_liked_songs(
+        path, failing=set(), resume=True
+    )
+    assert not_added == []
+    assert journal.is_done(None)
+    assert {"d3", "d7"} <= set(destination.liked)
+
+
+class PartialDestination(FlakyDestination):
+    def add_songs_to_playlist(self, playlist_id, song_ids):
+        failed = {
+            song_id: ValueError() for song_id in song_ids if song_id in self.failing
+        }
+        super().add_songs_to_playlist(
+            playlist_id, [song_id for song_id in song_ids if song_id not in failed]
+        )
+        if failed:
+            raise PartialWriteError(failed, len(song_ids))
+
+
+def sync_playlist(path, failing):
+    journal = TransferJournal(path, "origin", "flaky_destination")
+    origin = Origin(SyntheticLibrary(playlists={"p1": LIKED}))
+    destination = PartialDestination(failing)
+    with PlaylistTransferer(
+        origin, destination, journal=journal, sync=True, skip_unchanged=True
+    ) as transferer:
+        [playlist] = origin.get_all_playlists()
+        unchanged = transferer.is_unchanged(playlist)
+        transferer.transfer_playlist(playlist)
+    journal.close()
+    return unchanged
+
+
+def test_playlists_with_failed_writes_are_synced_again(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    sync_playlist(path, failing={"d3"})
+    assert not sync_playlist(path, failing=set())
+    assert sync_playlist(path, failing=set())
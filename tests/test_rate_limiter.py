@@ -0,0 +1,36 @@
+import httpx
+from deezer.exceptions import DeezerHTTPError
+
+from music_services.rate_limiter import get_status_code, is_retryable
+
+
+def deezer_error(status, text="error"):
+    request = httpx.Request("GET", "https://api.deezer.com/search")
+    response = httpx.Response(status, text=text, request=request)
+    error = httpx.HTTPStatusError("failed", request=request, response=response)
+    return DeezerHTTPError.from_http_error(error)
+
+
+def test_deezer_status_codes_are_read():
+    assert get_status_code(deezer_error(503)) == 503
+    assert get_status_code(deezer_error(429)) == 429
+    assert get_status_code(deezer_error(500, text="")) == 500
+
+
+def test_deezer_server_errors_are_retried():
+    assert is_retryable(deezer_error(503))
+    assert is_retryable(deezer_error(500))
+    assert is_retryable(deezer_error(429), idempotent=False)
+    assert not is_retryable(deezer_error(503), idempotent=False)
+    assert not is_retryable(deezer_error(404))
+
+
+def test_httpx_connection_errors_are_retried():
+    request = httpx.Request("GET", "https://api.deezer.com/search")
+    refused = httpx.ConnectError("refused", request=request)
+    assert is_retryable(refused)
+    assert is_retryable(refused, idempotent=False)
+    assert is_retryable(httpx.ReadTimeout("timed out", request=request))
+    assert not is_retryable(
+        httpx.ReadTimeout("timed out", request=request), idempotent=False
+    )
@@ -0,0 +1,43 @@
+from benchmarks.fake_services import SyntheticLibrary
+from music_services.music_service import Song
+from song_matcher import MIN_SCORE, score_candidates
+
+
+def accepted(song, candidate):
+    return score_candidates(song, [candidate])[0] >= MIN_SCORE
+
+
+def test_same_song_is_accepted():
+    song = Song("1", "Yesterday - Remastered 2009", "The Beatles", duration=125)
+    assert accepted(song, Song("2", "Yesterday", "The Beatles", duration=126))
+    assert accepted(song, Song("3", "Yesterday", "Beatles", duration=125))
+
+
+def test_wrong_artist_is_rejected():
+    assert not accepted(
+        Song("1", "Hello", "Adele"), Song("2", "Hello", "Lionel Richie")
+    )
+    assert not accepted(Song("1", "Intro", "The xx"), Song("2", "Intro", "M83"))
+
+
+def test_tribute_band_is_rejected():
+    song = Song("1", "Love Night 3", "Artist 3")
+    assert not accepted(song, Song("2", "Love Night 3", "Artist 3 Tribute Band"))
+
+
+def test_different_length_is_rejected():
+    song = Song("1", "Hello", "Adele", duration=295)
+    assert not accepted(song, Song("2", "Hello", "Adele", duration=360))
+
+
+def test_synthetic_decoys_are_rejected():
+    library = SyntheticLibrary.generate(3000, seed=1)
+    by_title = {}
+    for song in library.catalog:
+        by_title.setdefault(song.name, []).append(song)
+
+    for songs in library.playlists.values():
+        for song in songs:
+            for candidate in by_title.get(song.name, []):
+                if candidate.artist != song.artist:
+                    assert not accepted(song, candidate)
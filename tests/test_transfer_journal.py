@@ -0,0 +1,36 @@
+from transfer_journal import TransferJournal
+
+
+def reopen(path, origin="spotify", destination="deezer", resume=True):
+    return TransferJournal(str(path), origin, destination, resume=resume)
+
+
+def test_resuming_without_a_previous_run(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = reopen(path)
+    journal.record_destination_playlist("p1", "DEST1")
+    journal.record_position("p1", 100)
+    journal.close()
+
+    journal = reopen(path)
+    assert journal.get_destination_playlist("p1") == "DEST1"
+    assert journal.get_position("p1") == 100
+
+
+def test_resuming_after_another_pair_of_services(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = reopen(path, resume=False)
+    journal.record_position("p1", 10)
+    journal.close()
+    journal = reopen(path, "deezer", "ytmusic", resume=False)
+    journal.record_position("p2", 20)
+    journal.close()
+
+    journal = reopen(path)
+    journal.record_position("p1", 30)
+    journal.close()
+
+    assert reopen(path).get_position("p1") == 30
+    other = reopen(path, "deezer", "ytmusic")
+    assert other.get_position("p2") == 20
+    assert other.get_position("p1") == 0
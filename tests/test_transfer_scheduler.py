@@ -0,0 +1,22 @@
+from music_services.music_service import Playlist
+from music_services.ytmusic_service import parse_count
+from transfer_scheduler import TransferScheduler
+
+by_size = TransferScheduler._TransferScheduler__by_size
+
+
+def test_counts_are_parsed():
+    assert parse_count("25") == 25
+    assert parse_count("1,234") == 1234
+    assert parse_count(None) is None
+    assert parse_count("") is None
+
+
+def test_largest_playlists_go_first_and_unknown_sizes_last():
+    playlists = [
+        Playlist("a", "A", "", track_count=parse_count("25")),
+        Playlist("b", "B", "", track_count=parse_count(None)),
+        Playlist("c", "C", "", track_count=parse_count("1,234")),
+        Playlist("d", "D", "", track_count=parse_count("100")),
+    ]
+    assert [p.id for p in by_size(playlists)] == ["c", "d", "a", "b"]
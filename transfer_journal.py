@@ -0,0 +1,308 @@
+import json
+import os
+import threading
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from music_services.music_service import Song
+
+
+def get_state_path(journal_path: str) -> str:
+    return os.path.splitext(journal_path)[0] + ".state.json"
+
+
+class TransferState:
+    """
+    What later runs need from past ones, for each pair of services: the
+    destination playlist mapped to each origin playlist, and the change token
+    each origin playlist had when it was last completed.
+
+    The state is a small JSON file rewritten as a whole by save(), so its
+    size only depends on the number of playlists, not on the number of runs.
+    """
+
+    def __init__(self, path: str, origin: str, destination: str) -> None:
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__state: Dict[str, Dict[str, Dict[str, str]]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.__state = json.load(file)
+
+        pair = self.__state.setdefault(f"{origin}->{destination}", {})
+        self.__mappings = pair.setdefault("mappings", {})
+        self.__change_tokens = pair.setdefault("change_tokens", {})
+
+    # Keys are strings in JSON, while some services use numeric playlist IDs
+
+    def get_mapping(self, playlist_id: Optional[str]) -> Optional[str]:
+        return self.__mappings.get(str(playlist_id))
+
+    def set_mapping(
+        self, playlist_id: Optional[str], destination_playlist_id: str
+    ) -> None:
+        with self.__lock:
+            self.__mappings[str(playlist_id)] = destination_playlist_id
+
+    def get_change_token(self, playlist_id: Optional[str]) -> Optional[str]:
+        return self.__change_tokens.get(str(playlist_id))
+
+    def set_change_token(self, playlist_id: Optional[str], change_token: str) -> None:
+        with self.__lock:
+            self.__change_tokens[str(playlist_id)] = change_token
+
+    def save(self) -> None:
+        # Written to a temporary file first, so a crash never leaves a
+        # partial state behind
+        with self.__lock:
+            temporary_path = f"{self.path}.partial"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(self.__state, file)
+            os.replace(temporary_path, self.path)
+
+
+class TransferJournal:
+    """
+    Append-only JSONL journal of a transfer's progress, used to resume a run
+    that died halfway without creating duplicate playlists or repeating work.
+
+    Every run starts with a "run" record. It is followed by records for the
+    destination playlists created, the match found for each origin song, how
+    many songs of each playlist were committed to the destination, and which
+    playlists were completed. Playlists are identified by their origin ID, and
+    liked songs by None. A resumed run appends its records to the run it
+    resumes, after a "run" record marked as "resumed" if the journal does not
+    end with that run.
+
+    Only the last run of each pair of services is needed, so the records of
+    older runs are dropped whenever a new run starts. What later runs need
+    from every past run, the destination playlist mapped to each origin
+    playlist and the change token it had when it was last completed, is kept
+    in a TransferState next to the journal.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        origin: str,
+        destination: str,
+        resume: bool = False,
+        state_path: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.origin = origin
+        self.destination = destination
+
+        self.__lock = threading.Lock()
+        self.__state = TransferState(
+            state_path or get_state_path(path), origin, destination
+        )
+        self.__playlists: Dict[Optional[str], str] = {}
+        self.__matches: Dict[str, Optional[Song]] = {}
+        self.__positions: Dict[Optional[str], int] = {}
+        self.__done: Dict[Optional[str], List[Song]] = {}
+
+        in_run = False
+        if os.path.exists(path):
+            in_run = self.__load(compact=not resume)
+            # Journals written before the state existed kept the mappings
+            self.__state.save()
+        if not resume:
+            self.__clear_run()
+
+        self.__file = open(path, "a", encoding="utf-8")
+        if not resume:
+            self.__append({"type": "run", "origin": origin, "destination": destination})
+        elif not in_run:
+            # Without a header, the records of a resumed run would be ignored
+            # or filed under the run of another pair of services
+            self.__append(
+                {
+                    "type": "run",
+                    "origin": origin,
+                    "destination": destination,
+                    "resumed": True,
+                }
+            )
+
+    def __clear_run(self) -> None:
+        self.__playlists.clear()
+        self.__matches.clear()
+        self.__positions.clear()
+        self.__done.clear()
+
+    def __load(self, compact: bool) -> bool:
+        """
+        Loads the last run between the same pair of services, and drops the
+        older runs if compacting.
+
+        Returns:
+            bool: Whether the journal ends with a run of this pair, so that
+                the records of a resumed run can be appended without a header.
+        """
+        in_run = False
+        # Lines of the last run of every other pair of services
+        other_runs: Dict[Tuple[str, str], List[str]] = {}
+        other_run: Optional[List[str]] = None
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the previous run died
+                    # while writing it
+                    continue
+
+                if record["type"] == "run":
+                    pair = (record["origin"], record["destination"])
+                    in_run = pair == (self.origin, self.destination)
+                    # Resumed runs continue the last run of their pair
+                    resumed = record.get("resumed", False)
+                    if in_run:
+                        if not resumed:
+                            self.__clear_run()
+                        other_run = None
+                    elif resumed:
+                        other_run = other_runs.setdefault(pair, [])
+                    else:
+                        other_run = other_runs[pair] = []
+
+                if in_run:
+                    self.__apply(record)
+                elif other_run is not None:
+                    other_run.append(line)
+
+        if compact:
+            temporary_path = f"{self.path}.partial"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                for lines in other_runs.values():
+                    file.writelines(lines)
+            os.replace(temporary_path, self.path)
+        return in_run
+
+    def __apply(self, record: Dict[str, Any]) -> None:
+        kind = record["type"]
+        if kind == "playlist":
+            self.__playlists[record["playlist"]] = record["destination_playlist"]
+            self.__state.set_mapping(record["playlist"], record["destination_playlist"])
+        elif kind == "match":
+            match = record["match"]
+            self.__matches[record["song"]] = Song(**match) if match else None
+        elif kind == "progress":
+            self.__positions[record["playlist"]] = record["position"]
+        elif kind == "done":
+            self.__done[record["playlist"]] = [
+                Song(**song) for song in record["not_match"]
+            ]
+            if record.get("change_token") is not None:
+                self.__state.set_change_token(
+                    record["playlist"], record["change_token"]
+                )
+
+    def __append(self, record: Dict[str, Any]) -> None:
+        with self.__lock:
+            self.__file.write(json.dumps(record) + "\n")
+            self.__file.flush()
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__file.close()
+
+    def get_destination_playlist(self, playlist_id: Optional[str]) -> Optional[str]:
+        """
+        Returns the destination playlist created for an origin playlist by the
+        run being resumed.
+        """
+        return self.__playlists.get(playlist_id)
+
+    def get_mapped_playlist(self, playlist_id: Optional[str]) -> Optional[str]:
+        """
+        Returns the destination playlist most recently created or synced for an
+        origin playlist by any run.
+        """
+        return self.__state.get_mapping(playlist_id)
+
+    def record_destination_playlist(
+        self, playlist_id: Optional[str], destination_playlist_id: str
+    ) -> None:
+        self.__playlists[playlist_id] = destination_playlist_id
+        self.__state.set_mapping(playlist_id, destination_playlist_id)
+        self.__state.save()
+        self.__append(
+            {
+                "type": "playlist",
+                "playlist": playlist_id,
+                "destination_playlist": destination_playlist_id,
+            }
+        )
+
+    def get_match(self, song_id: str) -> Tuple[bool, Optional[Song]]:
+        """
+        Looks up the match recorded for an origin song.
+
+        Args:
+            song_id (str): The ID of the origin song.
+
+        Returns:
+            Tuple[bool, Optional[Song]]: Whether a match was recorded, and the
+                match (None if the song was not found).
+        """
+        song_id = str(song_id)
+        if song_id in self.__matches:
+            return True, self.__matches[song_id]
+        return False, None
+
+    def record_match(self, song_id: str, match: Optional[Song]) -> None:
+        song_id = str(song_id)
+        self.__matches[song_id] = match
+        self.__append(
+            {
+                "type": "match",
+                "song": song_id,
+                "match": asdict(match) if match else None,
+            }
+        )
+
+    def get_position(self, playlist_id: Optional[str]) -> int:
+        """
+        Returns how many songs from the start of a playlist were committed.
+        """
+        return self.__positions.get(playlist_id, 0)
+
+    def record_position(self, playlist_id: Optional[str], position: int) -> None:
+        self.__positions[playlist_id] = position
+        self.__append(
+            {"type": "progress", "playlist": playlist_id, "position": position}
+        )
+
+    def is_done(self, playlist_id: Optional[str]) -> bool:
+        return playlist_id in self.__done
+
+    def get_not_match(self, playlist_id: Optional[str]) -> List[Song]:
+        return self.__done.get(playlist_id, [])
+
+    def get_change_token(self, playlist_id: Optional[str]) -> Optional[str]:
+        """
+        Returns the change token an origin playlist had when it was last
+        completed by any run.
+        """
+        return self.__state.get_change_token(playlist_id)
+
+    def record_done(
+        self,
+        playlist_id: Optional[str],
+        not_match: List[Song],
+        change_token: Optional[str] = None,
+    ) -> None:
+        self.__done[playlist_id] = not_match
+        if change_token is not None:
+            self.__state.set_change_token(playlist_id, change_token)
+            self.__state.save()
+        self.__append(
+            {
+                "type": "done",
+                "playlist": playlist_id,
+                "not_match": [asdict(song) for song in not_match],
+                "change_token": change_token,
+            }
+        )
@@ -0,0 +1,133 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from music_services.music_service import Playlist, Song
+from playlist_transfer import PlaylistTransferer
+
+
+@dataclass
+class PlaylistTransferResult:
+    playlist: Playlist
+    not_match: List[Song] = field(default_factory=list)
+    error: Optional[Exception] = None
+
+
+class TransferScheduler:
+    """
+    Transfers several playlists at once. Every playlist shares the
+    transferer's search workers and the services' rate limiters, so running
+    more playlists in parallel never exceeds the global concurrency budget.
+
+    The songs of the next `prefetch` playlists are fetched from the origin in
+    the background while the current ones are being matched, so origin
+    latency overlaps with destination work. At most `prefetch` fetched
+    playlists wait in memory for their turn.
+    """
+
+    def __init__(
+        self,
+        transferer: PlaylistTransferer,
+        parallel_playlists: int = 1,
+        logger: Optional[logging.Logger] = None,
+        prefetch: int = 0,
+    ) -> None:
+        if parallel_playlists < 1:
+            raise ValueError("parallel_playlists must be at least 1")
+        if prefetch < 0:
+            raise ValueError("prefetch cannot be negative")
+
+        self.transferer = transferer
+        self.parallel_playlists = parallel_playlists
+        self.logger = logger or transferer.logger
+        self.prefetch = prefetch
+
+    @staticmethod
+    def __by_size(playlists: Iterable[Playlist]) -> List[Playlist]:
+        # Starting with the largest playlists keeps a long one from being the
+        # only transfer left running at the end. Unknown sizes go last.
+        return sorted(
+            playlists,
+            key=lambda p: p.track_count if p.track_count is not None else -1,
+            reverse=True,
+        )
+
+    def __fetch(self, playlist: Playlist) -> List[Song]:
+        songs = self.transferer.origin.iter_playlist_songs(playlist.id)
+        if songs is None:
+            raise ValueError(f"Could not retrieve songs from playlist {playlist.name}")
+        return list(songs)
+
+    def __transfer(
+        self, playlist: Playlist, prefetched: Optional[Future]
+    ) -> PlaylistTransferResult:
+        origin = self.transferer.origin.pretty_name()
+        destination = self.transferer.destination.pretty_name()
+        self.logger.info(
+            "--- Importing PLAYLIST %s FROM %s TO %s ---",
+            playlist.name,
+            origin,
+            destination,
+            extra={"event": "playlist_start", "playlist": playlist.id},
+        )
+
+        try:
+            songs = prefetched.result() if prefetched else None
+            not_match = self.transferer.transfer_playlist(playlist, songs)
+        except Exception as e:
+            self.logger.error(
+                "Could not import %s: %s",
+                playlist.name,
+                e,
+                extra={"event": "playlist_error", "playlist": playlist.id},
+            )
+            return PlaylistTransferResult(playlist, error=e)
+        return PlaylistTransferResult(playlist, not_match)
+
+    def run(self, playlists: Iterable[Playlist]) -> Iterator[PlaylistTransferResult]:
+        """
+        Transfers the playlists, largest first.
+
+        Args:
+            playlists (Iterable[Playlist]): The origin playlists to transfer.
+
+        Returns:
+            Iterator[PlaylistTransferResult]: The result of each playlist, in
+                the order they finish.
+        """
+        playlists = TransferScheduler.__by_size(playlists)
+        journal = self.transferer.journal
+
+        def is_skipped(playlist: Playlist) -> bool:
+            if journal and journal.is_done(playlist.id):
+                return True
+            return self.transferer.is_unchanged(playlist)
+
+        prefetched: Dict[int, Future] = {}
+        next_prefetch = 0
+        lock = threading.Lock()
+
+        def start(index: int) -> PlaylistTransferResult:
+            nonlocal next_prefetch
+            # Starting a playlist makes room for one more prefetched playlist
+            with lock:
+                next_prefetch = max(next_prefetch, index + 1)
+                while next_prefetch <= min(index + self.prefetch, len(playlists) - 1):
+                    playlist = playlists[next_prefetch]
+                    if not is_skipped(playlist):
+                        prefetched[next_prefetch] = fetcher.submit(
+                            self.__fetch, playlist
+                        )
+                    next_prefetch += 1
+                future = prefetched.pop(index, None)
+            return self.__transfer(playlists[index], future)
+
+        # Origin fetches run one at a time, like the origin's own pagination
+        with ThreadPoolExecutor(max_workers=1) as fetcher, ThreadPoolExecutor(
+            max_workers=self.parallel_playlists
+        ) as executor:
+            futures = [executor.submit(start, i) for i in range(len(playlists))]
+            for future in as_completed(futures):
+                yield future.result()